@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "analysis_cache.db"
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_PERSISTENT_ENTRIES = 10000
+
+def hash_pdf_bytes(pdf_bytes: bytes) -> str:
+    """Return the content hash used as the cache key for a PDF"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+def analysis_cache_key(pdf_bytes: bytes, model: str, version: str) -> str:
+    """Return the cache key for a PDF's analysis by a given model and prompt/parser version"""
+    return f"{hash_pdf_bytes(pdf_bytes)}:{model}:{version}"
+
+class AnalysisCache:
+    """Two-tier (in-memory LRU + SQLite) cache of PDF analysis results keyed by analysis_cache_key"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: Optional[int] = None,
+        max_memory_entries: Optional[int] = None,
+        max_persistent_entries: Optional[int] = None,
+    ):
+        """Initialize the cache, reading unset options from the environment"""
+        self.path = path or os.getenv("ANALYSIS_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.getenv("ANALYSIS_CACHE_TTL", DEFAULT_CACHE_TTL))
+        self.max_memory_entries = max_memory_entries if max_memory_entries is not None else int(
+            os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", DEFAULT_MEMORY_ENTRIES))
+        self.max_persistent_entries = max_persistent_entries if max_persistent_entries is not None else int(
+            os.getenv("ANALYSIS_CACHE_PERSISTENT_ENTRIES", DEFAULT_PERSISTENT_ENTRIES))
+
+        self._memory: "OrderedDict[str, tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                content_hash TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_analysis_cache_accessed_at ON analysis_cache (accessed_at)")
+        self._conn.commit()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, result: Dict):
+        """Insert into the memory tier, evicting least recently used entries"""
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached analysis for a key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return result
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT result, created_at FROM analysis_cache WHERE content_hash = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                result_json, created_at = row
+                if not self._is_expired(created_at, now):
+                    self._conn.execute(
+                        "UPDATE analysis_cache SET accessed_at = ? WHERE content_hash = ?", (now, key))
+                    self._conn.commit()
+                    result = json.loads(result_json)
+                    self._remember(key, created_at, result)
+                    self.hits += 1
+                    self.persistent_hits += 1
+                    return result
+                self._conn.execute("DELETE FROM analysis_cache WHERE content_hash = ?", (key,))
+                self._conn.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, result: Dict):
+        """Store an analysis result in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, result)
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (content_hash, result, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(result), now, now)
+                )
+                self._evict_persistent(now)
+                self._conn.commit()
+            except Exception as e:
+                # The memory tier still holds the result; a failed write only costs persistence
+                logger.error(f"Error writing analysis cache entry: {str(e)}")
+
+    def _evict_persistent(self, now: float):
+        """Drop expired rows and trim the persistent tier to its size limit"""
+        if self.ttl_seconds > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM analysis_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.evictions += max(cursor.rowcount, 0)
+        if self.max_persistent_entries > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM analysis_cache WHERE content_hash IN ("
+                "SELECT content_hash FROM analysis_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_persistent_entries,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM analysis_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and tier sizes"""
+        with self._lock:
+            persistent_entries = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "persistent_entries": persistent_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
@@ -1,11 +1,28 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-from datetime import datetime
+from datetime import date, datetime
 import uvicorn
 import logging
+import base64
+import hashlib
+import json
+import time
+import os
+import sys
+import asyncio
 from pdf_analyzer_service import PDFAnalyzer
+from job_store import JobStore
+from rate_limiter import CircuitOpenError
+
+# The crash report database models and queries live with the Streamlit UI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "client_ui"))
+from database import SessionLocal, ping as ping_crash_db
+from db_operations import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_crashes_page, get_cases_page, search_crashes
+from stats import get_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +47,83 @@ app.add_middleware(
 # Initialize PDF Analyzer
 pdf_analyzer = PDFAnalyzer()
 
+# Background job queue
+job_store = JobStore()
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2.0))
+job_available = asyncio.Event()
+background_tasks: List[asyncio.Task] = []
+
+# Upstream status is refreshed in the background so probes never call Claude themselves
+HEALTH_REFRESH_SECONDS = float(os.getenv("HEALTH_REFRESH_SECONDS", 60))
+upstream_status = {"claude_api": "unknown", "message": None, "checked_at": None}
+
+async def refresh_upstream_status():
+    """Periodically record whether the Claude API is reachable"""
+    while True:
+        success, message = await pdf_analyzer.check_upstream_async()
+        upstream_status.update(
+            claude_api="connected" if success else "error",
+            message=None if success else message,
+            checked_at=time.time()
+        )
+        if not success:
+            logger.warning(f"Claude API upstream check failed: {message}")
+        await asyncio.sleep(HEALTH_REFRESH_SECONDS)
+
+async def process_job(job_id: str):
+    """Analyze every outstanding file of a claimed job, recording results as they finish"""
+    pending = await asyncio.to_thread(job_store.pending_files, job_id)
+    positions = [position for position, _, _ in pending]
+    pdf_files = [(filename, contents) for _, filename, contents in pending]
+    async for outcome in pdf_analyzer.iter_analyses_async(pdf_files):
+        await asyncio.to_thread(
+            job_store.record_file_result,
+            job_id,
+            positions[outcome["index"]],
+            outcome.get("result"),
+            outcome.get("error")
+        )
+    await asyncio.to_thread(job_store.finish_job, job_id)
+
+async def job_worker(worker_number: int):
+    """Claim and process queued jobs until the service shuts down"""
+    while True:
+        try:
+            job_id = await asyncio.to_thread(job_store.claim_next_job)
+            if job_id is None:
+                job_available.clear()
+                try:
+                    await asyncio.wait_for(job_available.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info(f"Job worker {worker_number} processing job {job_id}")
+            await process_job(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job worker {worker_number} error: {str(e)}")
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+@app.on_event("startup")
+async def startup():
+    """Start the upstream health refresher and background job workers.
+
+    Jobs left queued or running by a previous process are resumed.
+    """
+    background_tasks.append(asyncio.create_task(refresh_upstream_status()))
+    for worker_number in range(JOB_WORKERS):
+        background_tasks.append(asyncio.create_task(job_worker(worker_number)))
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background tasks and release analyzer worker pools on shutdown"""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await pdf_analyzer.aclose()
+
 # Pydantic models for request/response validation
 class Vehicle(BaseModel):
     owner_name: str
@@ -48,17 +142,50 @@ class AnalysisResponse(BaseModel):
     crash_date: str
     vehicles: List[Dict]
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving requests (no network or disk I/O)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check(response: Response):
+    """Readiness probe from cached upstream status plus crash report DB, job store, pool and queue checks"""
+    crash_db_ok, job_store_ok = await asyncio.gather(
+        asyncio.to_thread(ping_crash_db), asyncio.to_thread(job_store.ping))
+    queue_depth = await asyncio.to_thread(job_store.queue_depth) if job_store_ok else None
+    circuit = pdf_analyzer.guard.breaker.state
+    ready = (upstream_status["claude_api"] == "connected" and circuit != "open"
+             and crash_db_ok and job_store_ok)
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "not_ready",
+        "upstream": {**upstream_status, "circuit_breaker": circuit},
+        "database": "connected" if crash_db_ok else "error",
+        "job_store": "connected" if job_store_ok else "error",
+        "job_queue_depth": queue_depth,
+        "workers": pdf_analyzer.pool_stats(),
+    }
+
 @app.get("/health")
 async def health_check():
-    """Check if the service is healthy and Claude API is accessible"""
-    try:
-        success, message = pdf_analyzer.test_connection()
-        if success:
-            return {"status": "healthy", "claude_api": "connected"}
-        return {"status": "degraded", "claude_api": "error", "message": message}
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    """Check if the service is healthy and Claude API is accessible (cached upstream status)"""
+    if upstream_status["claude_api"] == "connected":
+        return {"status": "healthy", "claude_api": "connected"}
+    return {"status": "degraded", "claude_api": upstream_status["claude_api"],
+            "message": upstream_status["message"]}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Report analysis cache hit/miss counters"""
+    if pdf_analyzer.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **pdf_analyzer.cache.stats()}
+
+@app.get("/usage")
+async def usage_stats():
+    """Report cumulative Claude token usage, including prompt cache reads and writes"""
+    return pdf_analyzer.usage_stats()
 
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_pdf(file: UploadFile = File(...)):
@@ -70,42 +197,326 @@ async def analyze_pdf(file: UploadFile = File(...)):
         # Read the uploaded file
         pdf_contents = await file.read()
         
-        # Analyze the PDF
-        result = pdf_analyzer.analyze_pdf(pdf_contents)
+        # Analyze the PDF off the event loop
+        result = await pdf_analyzer.analyze_pdf_async(pdf_contents)
         
         return AnalysisResponse(
             incident_summary=result['incident_summary'],
             crash_date=result['crash_date'],
             vehicles=result['vehicles']
         )
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error analyzing PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/analyze/batch")
-async def analyze_pdfs(files: List[UploadFile] = File(...)):
-    """Analyze multiple PDF crash reports"""
+async def analyze_pdfs(files: List[UploadFile] = File(...), pack: bool = Query(False)):
+    """Analyze multiple PDF crash reports concurrently, reporting failures per file.
+
+    With ``pack=true``, small reports are combined several to a Claude request.
+    """
     try:
-        results = []
+        pdf_files = []
+        errors = []
         for file in files:
             if not file.filename.endswith('.pdf'):
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"File {file.filename} must be a PDF"
-                )
-            
-            # Read and analyze each PDF
-            pdf_contents = await file.read()
-            result = pdf_analyzer.analyze_pdf(pdf_contents)
-            results.append({
+                errors.append({
+                    "filename": file.filename,
+                    "error": f"File {file.filename} must be a PDF"
+                })
+                continue
+            pdf_files.append((file.filename, await file.read()))
+
+        if pack:
+            outcomes = await pdf_analyzer.analyze_pdfs_packed_async(pdf_files)
+        else:
+            outcomes = await pdf_analyzer.analyze_pdfs_async(pdf_files)
+
+        results = []
+        for outcome in outcomes:
+            if "error" in outcome:
+                errors.append({"filename": outcome["filename"], "error": outcome["error"]})
+            else:
+                results.append({
+                    "filename": outcome["filename"],
+                    **outcome["result"]
+                })
+
+        return {"analyses": results, "errors": errors}
+    except Exception as e:
+        logger.error(f"Error in batch analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analyze/batch/stream")
+async def analyze_pdfs_stream(
+    files: List[UploadFile] = File(...),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$")
+):
+    """Analyze multiple PDF crash reports, streaming each result as soon as it is ready.
+
+    Records are sent in completion order as NDJSON lines or server-sent events,
+    followed by a final summary record.
+    """
+    pdf_files = []
+    rejected = []
+    for file in files:
+        if not file.filename.endswith('.pdf'):
+            rejected.append({
                 "filename": file.filename,
-                **result
+                "error": f"File {file.filename} must be a PDF"
             })
-        
-        return {"analyses": results}
+            continue
+        pdf_files.append((file.filename, await file.read()))
+
+    def encode(record: Dict) -> str:
+        if format == "sse":
+            return f"event: {record['type']}\ndata: {json.dumps(record)}\n\n"
+        return json.dumps(record) + "\n"
+
+    async def stream_records():
+        started = time.monotonic()
+        succeeded = 0
+        failed = 0
+        for outcome in rejected:
+            failed += 1
+            yield encode({"type": "error", **outcome})
+        async for outcome in pdf_analyzer.iter_analyses_async(pdf_files):
+            if "error" in outcome:
+                failed += 1
+                yield encode({"type": "error", "filename": outcome["filename"], "error": outcome["error"]})
+            else:
+                succeeded += 1
+                result = AnalysisResponse(**outcome["result"])
+                yield encode({"type": "result", "filename": outcome["filename"], **result.model_dump()})
+        yield encode({
+            "type": "summary",
+            "total": len(files),
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_seconds": round(time.monotonic() - started, 3)
+        })
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream_records(), media_type=media_type)
+
+@app.post("/jobs", status_code=202)
+async def create_job(files: List[UploadFile] = File(...)):
+    """Queue one or more PDF crash reports for background analysis"""
+    pdf_files = []
+    for file in files:
+        if not file.filename.endswith('.pdf'):
+            raise HTTPException(
+                status_code=400,
+                detail=f"File {file.filename} must be a PDF"
+            )
+        pdf_files.append((file.filename, await file.read()))
+
+    try:
+        job_id = await asyncio.to_thread(job_store.create_job, pdf_files)
     except Exception as e:
-        logger.error(f"Error in batch analysis: {str(e)}")
+        logger.error(f"Error creating job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    job_available.set()
+    return {"job_id": job_id, "status": "queued", "total_files": len(pdf_files)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status and per-file results of a background analysis job"""
+    job = await asyncio.to_thread(job_store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+# Read API over the stored crash reports, vehicles and cases
+
+CRASH_FIELDS = {"id", "filename", "incident_summary", "crash_date", "vehicles"}
+CASE_FIELDS = {"id", "vehicle_id", "status", "priority", "notes", "created_at", "updated_at", "vehicle"}
+
+def encode_cursor(cursor: Optional[tuple]) -> Optional[str]:
+    """Opaque, URL-safe form of a (sort value, id) keyset cursor"""
+    if cursor is None:
+        return None
+    sort_value, row_id = cursor
+    raw = json.dumps([sort_value.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str], parse_sort_value) -> Optional[tuple]:
+    """Inverse of encode_cursor; raises a 400 for cursors we did not issue"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        return parse_sort_value(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str], allowed: set) -> Optional[set]:
+    """Parse a comma-separated field projection; ``id`` is always included"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - allowed
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}; allowed: {', '.join(sorted(allowed))}"
+        )
+    return requested | {"id"}
+
+def project(item: Dict, fields: Optional[set]) -> Dict:
+    if fields is None:
+        return item
+    return {key: value for key, value in item.items() if key in fields}
+
+def conditional_json(request: Request, payload: Dict) -> Response:
+    """JSON response with a content ETag; 304 Not Modified when it matches If-None-Match"""
+    body = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode()
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def crash_filter_ranges(start_date: Optional[date], end_date: Optional[date],
+                        min_year: Optional[int], max_year: Optional[int]):
+    """Turn optional filter bounds into the (date_range, year_range) db_operations expects"""
+    date_range = None
+    if start_date or end_date:
+        date_range = (start_date or date.min, end_date or date.max)
+    year_range = None
+    if min_year is not None or max_year is not None:
+        year_range = (min_year if min_year is not None else 0, max_year if max_year is not None else 9999)
+    return date_range, year_range
+
+def read_page(fetch, **kwargs):
+    """Run a read-only database query in its own session"""
+    db = SessionLocal()
+    try:
+        return fetch(db, **kwargs)
+    finally:
+        db.close()
+
+@app.get("/crashes")
+async def list_crashes(
+    request: Request,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """List stored crash reports with their vehicles and cases, newest first.
+
+    Filters match the report page: crash date range and vehicle year range
+    (either bound may be omitted). Pass ``next_cursor`` back as ``cursor`` for
+    the next page, and ``fields`` to select top-level fields.
+    """
+    projection = parse_fields(fields, CRASH_FIELDS)
+    after = decode_cursor(cursor, date.fromisoformat)
+    date_range, year_range = crash_filter_ranges(start_date, end_date, min_year, max_year)
+
+    try:
+        page = await asyncio.to_thread(
+            read_page, get_crashes_page,
+            year_range=year_range, date_range=date_range, after=after, page_size=limit
+        )
+    except Exception as e:
+        logger.error(f"Error listing crash reports: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return conditional_json(request, {
+        "items": [project(item, projection) for item in jsonable_encoder(page.items)],
+        "next_cursor": encode_cursor(page.next_cursor),
+    })
+
+@app.get("/search")
+async def search_crash_reports(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """Full-text search over incident summaries and vehicle damage, owner and insurer fields.
+
+    Every word of ``q`` must match, in the summary or any vehicle of the report.
+    Results, filters, paging and projection are as for /crashes.
+    """
+    projection = parse_fields(fields, CRASH_FIELDS)
+    after = decode_cursor(cursor, date.fromisoformat)
+    date_range, year_range = crash_filter_ranges(start_date, end_date, min_year, max_year)
+
+    try:
+        page = await asyncio.to_thread(
+            read_page, search_crashes,
+            search=q, year_range=year_range, date_range=date_range, after=after, page_size=limit
+        )
+    except Exception as e:
+        logger.error(f"Error searching crash reports: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return conditional_json(request, {
+        "items": [project(item, projection) for item in jsonable_encoder(page.items)],
+        "next_cursor": encode_cursor(page.next_cursor),
+    })
+
+@app.get("/cases")
+async def list_cases(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None
+):
+    """List cases with their vehicle, newest first, with the same paging and projection as /crashes"""
+    projection = parse_fields(fields, CASE_FIELDS)
+    after = decode_cursor(cursor, datetime.fromisoformat)
+
+    try:
+        page = await asyncio.to_thread(read_page, get_cases_page, after=after, page_size=limit)
+    except Exception as e:
+        logger.error(f"Error listing cases: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    items = []
+    for item in jsonable_encoder(page.items):
+        # The vehicle's own case is the item itself
+        vehicle = {key: value for key, value in item["vehicle"].items() if key != "case"}
+        items.append({**item["case"], "vehicle": vehicle})
+    return conditional_json(request, {
+        "items": [project(item, projection) for item in items],
+        "next_cursor": encode_cursor(page.next_cursor),
+    })
+
+@app.get("/stats")
+async def crash_stats(
+    request: Request,
+    days: int = Query(30, ge=1, le=366),
+    top: int = Query(10, ge=1, le=100)
+):
+    """Dashboard statistics from the incrementally maintained rollups.
+
+    Crashes per day over the last ``days`` days, injury distribution, case
+    counts by status and priority, and the ``top`` towing companies and insurers.
+    """
+    try:
+        stats = await asyncio.to_thread(read_page, get_stats, days=days, top_n=top)
+    except Exception as e:
+        logger.error(f"Error reading stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    return conditional_json(request, stats)
 
 if __name__ == "__main__":
     uvicorn.run("api_service:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -1,13 +1,25 @@
 import os
+import sys
 import streamlit as st
 from anthropic import Anthropic
-from PyPDF2 import PdfReader
 from dotenv import load_dotenv
 import logging
 import json
-from db_operations import save_crash_report
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from db_operations import save_crash_reports
 from database import SessionLocal
 
+# Shared analysis modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_text import default_char_budget, extract_text
+from report_pruning import prune_report_text, pruning_enabled
+from prompts import CLAUDE_MODEL, USER_PROMPT_PREFIX, cached_system_prompt
+from rate_limiter import estimate_request_tokens, get_claude_guard
+from analysis_cache import hash_pdf_bytes
+
 # Load environment variables
 load_dotenv()
 
@@ -28,77 +40,49 @@ else:
         st.error("No API key found in .env file. Please add ANTHROPIC_API_KEY to your .env file.")
         st.stop()
 
-# Initialize Anthropic client
-anthropic = Anthropic(api_key=api_key)
+# Initialize Anthropic client; retries are handled by the shared ClaudeGuard
+anthropic = Anthropic(api_key=api_key, max_retries=0)
+claude_guard = get_claude_guard()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of uploaded files analyzed at once
+UI_ANALYSIS_WORKERS = int(os.getenv("UI_ANALYSIS_WORKERS", 4))
+
 def extract_text_from_pdf(pdf_file):
     """Extract text content from uploaded PDF file"""
-    pdf_reader = PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        try:
-            page_text = page.extract_text()
-            # Remove or replace problematic characters
-            text += ''.join(char if ord(char) < 128 else ' ' for char in page_text)
-            text += "\n"
-        except Exception as e:
-            st.error(f"Error processing page: {str(e)}")
-            continue
-    return text
+    return extract_text(
+        pdf_file,
+        max_chars=default_char_budget(),
+        on_error=lambda e: st.error(f"Error processing page: {str(e)}")
+    )
 
 def analyze_with_claude(text):
     """Send text to Claude for analysis"""
     try:
-        sanitized_text = ''.join(char if ord(char) < 128 else ' ' for char in text)
-        
-        system_prompt = """You are a specialized assistant analyzing automobile crash records.
-Analyze the provided crash report and return ONLY the following information in this EXACT format:
-
-INCIDENT SUMMARY:
-[2-3 sentence summary of the crash]
-
-CRASH DATE: [MM/DD/YYYY format - date only, no time]
-
-VEHICLE 1:
-Owner Name: [full name]
-Owner Address: [complete address]
-Make: [make]
-Model: [model]
-Year: [year]
-Damage: [damage details]
-Injuries: [injury status]
-Insurance Company: [insurance company name]
-Insurance Policy #: [policy number]
-Towing Company: [name of towing company]
-
-VEHICLE 2:
-Owner Name: [full name]
-Owner Address: [complete address]
-Make: [make]
-Model: [model]
-Year: [year]
-Damage: [damage details]
-Injuries: [injury status]
-Insurance Company: [insurance company name]
-Insurance Policy #: [policy number]
-Towing Company: [name of towing company]
-
-If any information is missing, write "Not specified"."""
-        
-        message = anthropic.messages.create(
-            model="claude-3-sonnet-20240229",
-            max_tokens=4096,
-            temperature=0,
-            system=system_prompt,
-            messages=[
+        if pruning_enabled():
+            text, _ = prune_report_text(text)
+
+        request = {
+            "model": CLAUDE_MODEL,
+            "max_tokens": 4096,
+            "temperature": 0,
+            "system": cached_system_prompt(),
+            "messages": [
                 {
                     "role": "user",
-                    "content": f"Analyze this crash report and extract the requested information: \n\n{sanitized_text}"
+                    "content": f"{USER_PROMPT_PREFIX}{text}"
                 }
             ]
+        }
+        message = claude_guard.call(
+            lambda: anthropic.messages.create(**request), estimate_request_tokens(request))
+        usage = message.usage
+        logger.info(
+            f"Claude usage: {usage.input_tokens} input, {usage.output_tokens} output, "
+            f"{getattr(usage, 'cache_read_input_tokens', 0) or 0} cache read, "
+            f"{getattr(usage, 'cache_creation_input_tokens', 0) or 0} cache write tokens"
         )
         # Return the actual content from the message
         return str(message.content)
@@ -106,10 +90,24 @@ If any information is missing, write "Not specified"."""
         st.error(str(e))
         return None
 
+@st.cache_data(show_spinner=False, max_entries=500)
+def analyze_pdf_content(content_hash, _pdf_bytes, _filename):
+    """Extract and analyze a PDF, memoized on its content hash across reruns.
+
+    Raises ValueError on failure so failed analyses are not cached.
+    """
+    text_content = extract_text_from_pdf(BytesIO(_pdf_bytes))
+    if not text_content.strip():
+        raise ValueError(f"No text could be extracted from {_filename}")
+    analysis = analyze_with_claude(text_content)
+    if not analysis:
+        raise ValueError(f"Failed to analyze {_filename}")
+    return analysis
+
 def test_claude_connection():
     try:
         test_message = anthropic.messages.create(
-            model="claude-3-sonnet-20240229",
+            model=CLAUDE_MODEL,
             max_tokens=100,
             messages=[
                 {
@@ -306,6 +304,111 @@ def reset_session_state():
 if 'previous_files' not in st.session_state:
     st.session_state.previous_files = None
 
+# Content hashes of uploads already written to the database in this session
+if 'saved_reports' not in st.session_state:
+    st.session_state.saved_reports = set()
+
+def render_report_styles():
+    """Inject the CSS used by render_report"""
+    st.markdown("""
+        <style>
+        .summary-box {
+            background-color: #f0f2f6;
+            border-radius: 10px;
+            padding: 20px;
+            margin: 10px 0;
+        }
+        .vehicle-box {
+            background-color: #ffffff;
+            border: 1px solid #e0e0e0;
+            border-radius: 10px;
+            padding: 20px;
+            margin: 10px 0;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .report-separator {
+            margin: 40px 0;
+            border-top: 2px solid #e0e0e0;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+
+def render_report(idx, filename, analysis):
+    """Render one report's summary, crash date and vehicle boxes"""
+    if idx > 0:
+        st.markdown('<div class="report-separator"></div>', unsafe_allow_html=True)
+    
+    st.subheader(f"📄 Report: {filename}")
+    
+    # Extract summary and crash date
+    sections = analysis.split("VEHICLE")
+    summary_section = sections[0]
+    summary = summary_section.split("CRASH DATE:")[0].replace("INCIDENT SUMMARY:", "").strip()
+    summary = summary.replace("[TextBlock(text='", "").replace("')", "").replace("\\n", " ").strip()
+
+    try:
+        crash_date = summary_section.split("CRASH DATE:")[1].strip()
+        crash_date = clean_display_text(crash_date)
+    except:
+        crash_date = "Not specified"
+
+    # Display Summary
+    st.subheader("📝 Incident Summary")
+    st.markdown(f'<div class="summary-box">{summary}</div>', unsafe_allow_html=True)
+
+    # Display Crash Date
+    st.subheader("📅 Crash Date")
+    st.markdown(f'<div class="summary-box">{crash_date}</div>', unsafe_allow_html=True)
+    
+    # Display Vehicle Information
+    st.subheader("🚗 Vehicle Information")
+    col1, col2 = st.columns(2)
+    
+    # Vehicle 1
+    with col1:
+        vehicle1_info = sections[1].split("VEHICLE 2:")[0]
+        v1_clean = (vehicle1_info
+                    .replace("1:", "")
+                    .replace("\\n", " ")
+                    .replace("')", "")
+                    .replace("type='text'", "")
+                    .replace(", type='text']", "")
+                    .strip())
+        
+        formatted_v1 = (v1_clean
+                       .replace("Owner Name:", "<br><b>Owner Name:</b>")
+                       .replace("Owner Address:", "<br><b>Owner Address:</b>")
+                       .replace("Make:", "<br><b>Make:</b>")
+                       .replace("Model:", "<br><b>Model:</b>")
+                       .replace("Year:", "<br><b>Year:</b>")
+                       .replace("Damage:", "<br><b>Damage:</b>")
+                       .replace("Injuries:", "<br><b>Injuries:</b>")
+                       .replace("Insurance Company:", "<br><b>Insurance Company:</b>")
+                       .replace("Insurance Policy #:", "<br><b>Insurance Policy #:</b>")
+                       .replace("Towing Company:", "<br><b>Towing Company:</b>"))
+        
+        st.markdown(f'<div class="vehicle-box">{formatted_v1}</div>', unsafe_allow_html=True)
+    
+    # Vehicle 2
+    with col2:
+        if len(sections) > 2:
+            vehicle2_info = sections[2]
+            v2_clean = clean_display_text(vehicle2_info.replace("2:", ""))
+            
+            formatted_v2 = (v2_clean
+                           .replace("Owner Name:", "<br><b>Owner Name:</b>")
+                           .replace("Owner Address:", "<br><b>Owner Address:</b>")
+                           .replace("Make:", "<br><b>Make:</b>")
+                           .replace("Model:", "<br><b>Model:</b>")
+                           .replace("Year:", "<br><b>Year:</b>")
+                           .replace("Damage:", "<br><b>Damage:</b>")
+                           .replace("Injuries:", "<br><b>Injuries:</b>")
+                           .replace("Insurance Company:", "<br><b>Insurance Company:</b>")
+                           .replace("Insurance Policy #:", "<br><b>Insurance Policy #:</b>")
+                           .replace("Towing Company:", "<br><b>Towing Company:</b>"))
+            
+            st.markdown(f'<div class="vehicle-box">{formatted_v2}</div>', unsafe_allow_html=True)
+
 # Streamlit UI
 st.title("PDF Analysis with Claude AI")
 st.write("Upload a PDF file to get an AI-powered analysis")
@@ -323,135 +426,68 @@ uploaded_files = st.file_uploader("Choose PDF files", type="pdf", accept_multipl
 
 if uploaded_files:
     try:
-        all_analyses = []
-        
-        for uploaded_file in uploaded_files:
-            with st.spinner(f"Processing {uploaded_file.name}..."):
-                text_content = extract_text_from_pdf(uploaded_file)
-                
-                if not text_content.strip():
-                    st.error(f"No text could be extracted from {uploaded_file.name}")
-                    continue
-                
-                with st.spinner(f"🔄 Analyzing {uploaded_file.name}..."):
-                    analysis = analyze_with_claude(text_content)
-                    if analysis:
-                        all_analyses.append((uploaded_file.name, analysis))
-                    else:
-                        st.error(f"Failed to analyze {uploaded_file.name}")
-
-        if all_analyses:
-            # Add styling
-            st.markdown("""
-                <style>
-                .summary-box {
-                    background-color: #f0f2f6;
-                    border-radius: 10px;
-                    padding: 20px;
-                    margin: 10px 0;
-                }
-                .vehicle-box {
-                    background-color: #ffffff;
-                    border: 1px solid #e0e0e0;
-                    border-radius: 10px;
-                    padding: 20px;
-                    margin: 10px 0;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }
-                .report-separator {
-                    margin: 40px 0;
-                    border-top: 2px solid #e0e0e0;
-                }
-                </style>
-            """, unsafe_allow_html=True)
-
-            # Process each analysis
-            for idx, (filename, analysis) in enumerate(all_analyses):
-                if idx > 0:
-                    st.markdown('<div class="report-separator"></div>', unsafe_allow_html=True)
-                
-                st.subheader(f"📄 Report: {filename}")
-                
-                # Extract summary and crash date
-                sections = analysis.split("VEHICLE")
-                summary_section = sections[0]
-                summary = summary_section.split("CRASH DATE:")[0].replace("INCIDENT SUMMARY:", "").strip()
-                summary = summary.replace("[TextBlock(text='", "").replace("')", "").replace("\\n", " ").strip()
-
+        render_report_styles()
+        total = len(uploaded_files)
+        progress = st.progress(0.0, text=f"Analyzing {total} report(s)...")
+        completed = []
+        ctx = get_script_run_ctx()
+
+        def analyze_in_worker(content_hash, pdf_bytes, filename):
+            # Worker threads need the script context to use st.cache_data and report errors
+            add_script_run_ctx(threading.current_thread(), ctx)
+            return analyze_pdf_content(content_hash, pdf_bytes, filename)
+
+        with ThreadPoolExecutor(max_workers=UI_ANALYSIS_WORKERS) as executor:
+            futures = {}
+            for index, uploaded_file in enumerate(uploaded_files):
+                pdf_bytes = uploaded_file.getvalue()
+                content_hash = hash_pdf_bytes(pdf_bytes)
+                future = executor.submit(analyze_in_worker, content_hash, pdf_bytes, uploaded_file.name)
+                futures[future] = (index, uploaded_file.name, content_hash)
+
+            # Render each report as soon as it finishes
+            for done, future in enumerate(as_completed(futures), start=1):
+                index, filename, content_hash = futures[future]
                 try:
-                    crash_date = summary_section.split("CRASH DATE:")[1].strip()
-                    crash_date = clean_display_text(crash_date)
-                except:
-                    crash_date = "Not specified"
-
-                # Display Summary
-                st.subheader("📝 Incident Summary")
-                st.markdown(f'<div class="summary-box">{summary}</div>', unsafe_allow_html=True)
-
-                # Display Crash Date
-                st.subheader("📅 Crash Date")
-                st.markdown(f'<div class="summary-box">{crash_date}</div>', unsafe_allow_html=True)
-                
-                # Display Vehicle Information
-                st.subheader("🚗 Vehicle Information")
-                col1, col2 = st.columns(2)
-                
-                # Vehicle 1
-                with col1:
-                    vehicle1_info = sections[1].split("VEHICLE 2:")[0]
-                    v1_clean = (vehicle1_info
-                                .replace("1:", "")
-                                .replace("\\n", " ")
-                                .replace("')", "")
-                                .replace("type='text'", "")
-                                .replace(", type='text']", "")
-                                .strip())
-                    
-                    formatted_v1 = (v1_clean
-                                   .replace("Owner Name:", "<br><b>Owner Name:</b>")
-                                   .replace("Owner Address:", "<br><b>Owner Address:</b>")
-                                   .replace("Make:", "<br><b>Make:</b>")
-                                   .replace("Model:", "<br><b>Model:</b>")
-                                   .replace("Year:", "<br><b>Year:</b>")
-                                   .replace("Damage:", "<br><b>Damage:</b>")
-                                   .replace("Injuries:", "<br><b>Injuries:</b>")
-                                   .replace("Insurance Company:", "<br><b>Insurance Company:</b>")
-                                   .replace("Insurance Policy #:", "<br><b>Insurance Policy #:</b>")
-                                   .replace("Towing Company:", "<br><b>Towing Company:</b>"))
-                    
-                    st.markdown(f'<div class="vehicle-box">{formatted_v1}</div>', unsafe_allow_html=True)
-                
-                # Vehicle 2
-                with col2:
-                    if len(sections) > 2:
-                        vehicle2_info = sections[2]
-                        v2_clean = clean_display_text(vehicle2_info.replace("2:", ""))
-                        
-                        formatted_v2 = (v2_clean
-                                       .replace("Owner Name:", "<br><b>Owner Name:</b>")
-                                       .replace("Owner Address:", "<br><b>Owner Address:</b>")
-                                       .replace("Make:", "<br><b>Make:</b>")
-                                       .replace("Model:", "<br><b>Model:</b>")
-                                       .replace("Year:", "<br><b>Year:</b>")
-                                       .replace("Damage:", "<br><b>Damage:</b>")
-                                       .replace("Injuries:", "<br><b>Injuries:</b>")
-                                       .replace("Insurance Company:", "<br><b>Insurance Company:</b>")
-                                       .replace("Insurance Policy #:", "<br><b>Insurance Policy #:</b>")
-                                       .replace("Towing Company:", "<br><b>Towing Company:</b>"))
-                        
-                        st.markdown(f'<div class="vehicle-box">{formatted_v2}</div>', unsafe_allow_html=True)
+                    analysis = future.result()
+                except ValueError as e:
+                    st.error(str(e))
+                except Exception as e:
+                    # A corrupt upload (e.g. PdfReadError) fails only its own report, not the batch
+                    st.error(f"Error processing {filename}: {str(e)}")
+                else:
+                    render_report(len(completed), filename, analysis)
+                    completed.append((index, filename, analysis, content_hash))
+                progress.progress(done / total, text=f"Analyzed {done} of {total} report(s)")
 
+        # Export and save in upload order
+        completed.sort()
+        all_analyses = [(filename, analysis) for _, filename, analysis, _ in completed]
+        analysis_hashes = [content_hash for _, _, _, content_hash in completed]
+
+        if all_analyses:
             # Export all analyses as JSON
             st.markdown("<br>", unsafe_allow_html=True)
             json_data = format_analysis_for_json(all_analyses)
             json_string = json.dumps(json_data, indent=2)
 
-            # Save to database
+            # Save to database, once per uploaded file content
+            unsaved = [
+                (content_hash, report)
+                for content_hash, report in zip(analysis_hashes, json_data)
+                if content_hash not in st.session_state.saved_reports
+            ]
             db = SessionLocal()
             try:
-                for report in json_data:
-                    save_crash_report(db, report)
-                st.success("✅ Successfully saved reports to database!")
+                if unsaved:
+                    counts = save_crash_reports(db, [report for _, report in unsaved])
+                    st.session_state.saved_reports.update(content_hash for content_hash, _ in unsaved)
+                    st.success(
+                        f"✅ Successfully saved reports to database! "
+                        f"({counts['inserted']} new, {counts['skipped']} already saved"
+                        + (f", {counts['invalid']} without a valid crash date" if counts['invalid'] else "")
+                        + ")"
+                    )
             except Exception as e:
                 st.error(f"Failed to save to database: {str(e)}")
             finally:
@@ -0,0 +1,85 @@
+"""Throughput benchmark for the priority rules' damage keyword matcher.
+
+Scores synthetic damage descriptions with the original per-keyword substring
+scan, the compiled KeywordMatcher and the full PriorityRules.score_batch, and
+prints vehicles per second for each.
+
+    python benchmark_priority_rules.py --vehicles 200000 --keywords 50
+"""
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from priority_rules import DEFAULT_RULES, KeywordMatcher, PriorityRules
+
+FILLER_WORDS = [
+    "front", "rear", "bumper", "door", "panel", "driver", "passenger", "side", "quarter", "hood",
+    "scratches", "dent", "damage", "to", "the", "and", "with", "minor", "cracked", "windshield",
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=200000, help="descriptions to score (default: 200000)")
+    parser.add_argument("--keywords", type=int, default=len(DEFAULT_RULES["damage_keywords"]),
+                        help="damage keywords in the rule set; extra ones are synthetic (default: the configured six)")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+def make_keywords(count: int) -> dict:
+    keywords = dict(DEFAULT_RULES["damage_keywords"])
+    # Numbered from 0 so short names prefix longer ones with other weights (keyword1, keyword12)
+    for i in range(count - len(keywords)):
+        keywords[f"keyword{i}"] = 1 + i % 3
+    return keywords
+
+def make_vehicles(count: int, keywords: list, rng: random.Random) -> list:
+    vehicles = []
+    for _ in range(count):
+        words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(4, 20))]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords).upper())
+        vehicles.append(SimpleNamespace(
+            damage=" ".join(words),
+            year=rng.randint(1995, 2025),
+            injuries="Not specified",
+            towing_company=rng.choice([None, "Joe's Towing"]),
+            insurance_company=rng.choice([None, "Progressive", "Geico"]),
+        ))
+    return vehicles
+
+def timed(label: str, count: int, fn) -> float:
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed * 1000:9.1f} ms  {count / elapsed:12,.0f} vehicles/s")
+    return result
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    keywords = make_keywords(args.keywords)
+    vehicles = make_vehicles(args.vehicles, list(keywords), rng)
+    print(f"{args.vehicles:,} vehicles, {len(keywords)} damage keywords")
+
+    keyword_list = list(keywords)
+    legacy = timed("substring scan (original)", args.vehicles, lambda: [
+        any(keyword in vehicle.damage.lower() for keyword in keyword_list) for vehicle in vehicles
+    ])
+    matcher = KeywordMatcher(keywords)
+    compiled = timed("compiled matcher", args.vehicles, lambda: [
+        matcher.weight(vehicle.damage) > 0 for vehicle in vehicles
+    ])
+    if legacy != compiled:
+        raise SystemExit("Compiled matcher disagrees with the substring scan")
+    # Untimed: the highest matching weight must agree too, including keywords that prefix others
+    for vehicle in vehicles:
+        damage = vehicle.damage.lower()
+        expected = max((weight for keyword, weight in keywords.items() if keyword in damage), default=0)
+        if matcher.weight(vehicle.damage) != expected:
+            raise SystemExit(f"Compiled matcher weight disagrees with the substring scan on {vehicle.damage!r}")
+
+    rules = PriorityRules({**DEFAULT_RULES, "damage_keywords": keywords})
+    timed("full rules, score_batch", args.vehicles, lambda: rules.score_batch(vehicles))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Query-plan regression check for the report and case queries.
+
+Seeds a scratch database with a representative volume of crashes, vehicles
+and cases, then EXPLAINs the queries the Streamlit pages run and fails if any
+of them falls back to a full table scan.
+
+    python check_query_plans.py --database-url postgresql://.../scratch_db --reports 50000
+
+Never point this at the production database: it inserts synthetic rows.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+DEFAULT_CHECK_URL = "sqlite:///query_plan_check.db"
+SCANNED_TABLES = {"crash_reports", "vehicles", "cases"}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=DEFAULT_CHECK_URL,
+                        help=f"scratch database to seed and check (default: {DEFAULT_CHECK_URL})")
+    parser.add_argument("--reports", type=int, default=50000,
+                        help="number of crash reports to seed (default: 50000)")
+    return parser.parse_args()
+
+args = parse_args()
+# database.py reads DATABASE_URL when it first connects
+os.environ["DATABASE_URL"] = args.database_url
+
+from sqlalchemy import insert, text
+from database import SessionLocal, CrashReport, Vehicle, Case, CaseStatus, CasePriority
+from db_operations import build_filtered_crashes_query, build_cases_query, save_crash_reports
+
+def seed(db, report_count: int):
+    """Insert synthetic reports spread over five years, two vehicles each, cases for a fifth"""
+    existing = db.query(CrashReport).count()
+    if existing >= report_count:
+        return
+    rng = random.Random(42)
+    first_day = date.today() - timedelta(days=5 * 365)
+    reports = []
+    for i in range(existing, report_count):
+        crash_date = first_day + timedelta(days=rng.randrange(5 * 365))
+        vehicles = {}
+        for number in (1, 2):
+            vehicles[f"vehicle{number}"] = {
+                "owner_name": f"Owner {i}-{number}",
+                "owner_address": f"{i} Main St",
+                "make": rng.choice(["Ford", "Toyota", "Honda", "Chevrolet"]),
+                "model": "Model",
+                "year": rng.randint(1995, date.today().year),
+                "damage": rng.choice(["minor scratches", "severe front damage", "totaled"]),
+                "injuries": "Not specified",
+            }
+        reports.append({
+            "filename": f"seed_{i}.pdf",
+            "incident_summary": "Synthetic report for query plan checks",
+            "crash_date": crash_date.strftime("%m/%d/%Y"),
+            **vehicles,
+        })
+    save_crash_reports(db, reports)
+
+    vehicle_ids = [row[0] for row in db.query(Vehicle.id).outerjoin(Case).filter(Case.id.is_(None))]
+    case_rows = [
+        {"vehicle_id": vehicle_id, "status": CaseStatus.NEW, "priority": CasePriority.MEDIUM}
+        for vehicle_id in vehicle_ids if rng.random() < 0.2
+    ]
+    if case_rows:
+        db.execute(insert(Case), case_rows)
+    db.commit()
+
+def compile_query(db, query) -> str:
+    return str(query.statement.compile(bind=db.get_bind(), compile_kwargs={"literal_binds": True}))
+
+def full_scans(db, sql: str) -> list:
+    """Return the names of the checked tables the plan reads with a full scan"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = []
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in SCANNED_TABLES:
+                scans.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+        return scans
+    # SQLite: "SCAN <table>" without an index is a full scan; "SEARCH" and "USING ... INDEX" are not
+    scans = []
+    for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+        detail = row[-1]
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in SCANNED_TABLES and "INDEX" not in detail:
+            scans.append(words[1])
+    return scans
+
+def main():
+    db = SessionLocal()
+    try:
+        seed(db, args.reports)
+        # Refresh planner statistics so plans reflect the seeded volume
+        db.execute(text("ANALYZE"))
+        db.commit()
+
+        today = date.today()
+        this_year = today.year
+        checks = {
+            "crashes: last 14 days, vehicle years": build_filtered_crashes_query(
+                db, year_range=(this_year - 10, this_year), date_range=(today - timedelta(days=14), today)),
+            "crashes: last 14 days": build_filtered_crashes_query(
+                db, date_range=(today - timedelta(days=14), today)),
+            "crashes: page after cursor": build_filtered_crashes_query(
+                db, after=(today - timedelta(days=365), 1000)).limit(25),
+            "crashes: full-text search": build_filtered_crashes_query(db, search="severe damage").limit(25),
+            "vehicles of one crash": db.query(Vehicle).filter(Vehicle.crash_report_id == 1),
+            "case of one vehicle": db.query(Case).filter(Case.vehicle_id == 1),
+            "latest cases page": build_cases_query(db).limit(50),
+            "cases: page after cursor": build_cases_query(
+                db, after=(datetime.utcnow() - timedelta(days=1), 1000)).limit(50),
+        }
+
+        failed = False
+        for name, query in checks.items():
+            scans = full_scans(db, compile_query(db, query))
+            status = "FULL SCAN on " + ", ".join(scans) if scans else "ok"
+            print(f"{name}: {status}")
+            failed = failed or bool(scans)
+        return 1 if failed else 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,91 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Text, String, ForeignKey, Enum
+from sqlalchemy import create_engine, event, Column, Integer, String, Date, DateTime, Text, String, ForeignKey, Enum, Index, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import Session, sessionmaker, relationship
 from datetime import datetime
+import logging
 import os
+import threading
+from typing import Optional
 from dotenv import load_dotenv
-from sqlalchemy.dialects.postgresql import ENUM
 from enum import Enum as PyEnum
 from sqlalchemy.types import TypeDecorator, Enum as SQLAlchemyEnum
+from migrations import run_migrations
 
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+logger = logging.getLogger(__name__)
+
+# Embedded SQLite database used when DATABASE_URL is not set (local runs and tests). It lives
+# next to this module, so the UI and the API open the same file whatever their working directory
+DEFAULT_DATABASE_URL = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "crash_reports.db")
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_RECYCLE = 1800
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets Streamlit sessions read while another writes; SQLite leaves FK enforcement off by default"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def create_db_engine(database_url: str) -> Engine:
+    """Create an engine for PostgreSQL (pool settings from env) or the embedded SQLite mode"""
+    if database_url.startswith("sqlite"):
+        engine = create_engine(database_url, connect_args={"check_same_thread": False, "timeout": 30})
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        return engine
+    return create_engine(
+        database_url,
+        pool_size=int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", DEFAULT_MAX_OVERFLOW)),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", DEFAULT_POOL_RECYCLE)),
+        # Test connections on checkout so a restarted database doesn't surface as errors
+        pool_pre_ping=_env_flag("DB_POOL_PRE_PING", True),
+    )
+
+def get_engine() -> Engine:
+    """Return the process-wide engine, creating it and applying migrations on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                database_url = os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+                if database_url == DEFAULT_DATABASE_URL:
+                    logger.info(f"DATABASE_URL not set; using embedded SQLite database {database_url}")
+                engine = create_db_engine(database_url)
+                run_migrations(engine)
+                _engine = engine
+    return _engine
+
+def SessionLocal() -> Session:
+    """Open a session on the lazily created engine"""
+    return _session_factory(bind=get_engine())
+
+def ping() -> bool:
+    """Return True if the crash report database answers a trivial query"""
+    try:
+        with SessionLocal() as db:
+            db.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        logger.error(f"Crash report database ping failed: {str(e)}")
+        return False
 
 Base = declarative_base()
 
 class EnumAsStr(TypeDecorator):
     impl = SQLAlchemyEnum
+    # Stateless beyond the enum class, so statements using it can be cached
+    cache_ok = True
     
     def process_bind_param(self, value, dialect):
         if value is None:
@@ -46,7 +114,8 @@ INJURY_STATUSES = [
     'Not specified'
 ]
 
-injury_status_enum = ENUM(*INJURY_STATUSES, name='injury_status')
+# Native enum type on PostgreSQL, VARCHAR on SQLite
+injury_status_enum = Enum(*INJURY_STATUSES, name='injury_status')
 
 # Models
 class CrashReport(Base):
@@ -61,6 +130,13 @@ class CrashReport(Base):
     
     vehicles = relationship("Vehicle", back_populates="crash_report", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Natural key used for duplicate detection and ON CONFLICT bulk inserts
+        Index('uq_crash_reports_filename_crash_date', 'filename', 'crash_date', unique=True),
+        # Date range filter, newest-first ordering and keyset pagination
+        Index('ix_crash_reports_crash_date_id', 'crash_date', 'id'),
+    )
+
 class Case(Base):
     __tablename__ = "cases"
     
@@ -74,6 +150,12 @@ class Case(Base):
     
     vehicle = relationship("Vehicle", back_populates="case")
 
+    __table_args__ = (
+        # One case per vehicle; also serves the vehicle -> case join
+        Index('uq_cases_vehicle_id', 'vehicle_id', unique=True),
+        Index('ix_cases_created_at_id', 'created_at', 'id'),
+    )
+
 class Vehicle(Base):
     __tablename__ = "vehicles"
     
@@ -95,8 +177,23 @@ class Vehicle(Base):
     crash_report = relationship("CrashReport", back_populates="vehicles")
     case = relationship("Case", back_populates="vehicle", uselist=False)
 
+    __table_args__ = (
+        # crash -> vehicles join, and the vehicle year filter within a crash
+        Index('ix_vehicles_crash_report_id_year', 'crash_report_id', 'year'),
+        Index('ix_vehicles_year', 'year'),
+    )
+
+class StatRollup(Base):
+    """Incrementally maintained dashboard counter: one value per (metric, bucket), see stats.py"""
+    __tablename__ = "stat_rollups"
+
+    metric = Column(String(50), primary_key=True)
+    bucket = Column(String(255), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Connect and bring the schema up to date through the versioned migrations in migrations.py.
 
-# Call it immediately when the module is imported
-init_db()
\ No newline at end of file
+    Happens automatically on first use; call this to do it eagerly (e.g. at deploy time).
+    """
+    get_engine()
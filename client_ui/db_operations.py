@@ -1,62 +1,240 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, extract
-from datetime import datetime
+from sqlalchemy.orm import Session, selectinload, contains_eager
+from sqlalchemy import or_, and_, extract, insert, update, text, false, Integer, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
 from database import CrashReport, Vehicle, INJURY_STATUSES, CasePriority, Case, CaseStatus
+from stats import apply_deltas, case_deltas, crash_report_deltas
+from priority_rules import PriorityRules, get_rules
+
+BULK_INSERT_CHUNK_SIZE = 1000
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+
+# Read models: plain snapshots returned to the pages, so rendering never
+# triggers lazy loads and nothing depends on the session staying open.
+@dataclass(frozen=True)
+class CaseSummary:
+    id: int
+    vehicle_id: int
+    status: CaseStatus
+    priority: CasePriority
+    notes: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+@dataclass(frozen=True)
+class VehicleSummary:
+    id: int
+    vehicle_number: int
+    owner_name: str
+    owner_address: str
+    make: str
+    model: str
+    year: Optional[int]
+    damage: str
+    injuries: str
+    insurance_company: Optional[str]
+    insurance_policy_number: Optional[str]
+    towing_company: Optional[str]
+    case: Optional[CaseSummary]
+
+@dataclass(frozen=True)
+class CrashSummary:
+    id: int
+    filename: str
+    incident_summary: str
+    crash_date: date
+    vehicles: List[VehicleSummary]
+
+@dataclass(frozen=True)
+class CaseListItem:
+    case: CaseSummary
+    vehicle: VehicleSummary
+
+@dataclass(frozen=True)
+class Page:
+    """One page of a keyset-paginated listing; pass next_cursor as ``after`` to get the next one"""
+    items: List[Any]
+    next_cursor: Optional[tuple]
+
+def _keyset_after(sort_column, id_column, after: tuple):
+    """Rows strictly after ``after`` = (sort value, id) in (sort desc, id desc) order"""
+    sort_value, row_id = after
+    return or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < row_id))
+
+def _clamp_page_size(page_size: int) -> int:
+    return max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+def _case_summary(case: Case) -> CaseSummary:
+    return CaseSummary(
+        id=case.id,
+        vehicle_id=case.vehicle_id,
+        status=case.status,
+        priority=case.priority,
+        notes=case.notes,
+        created_at=case.created_at,
+        updated_at=case.updated_at,
+    )
+
+def _vehicle_summary(vehicle: Vehicle, case: Optional[CaseSummary] = None) -> VehicleSummary:
+    return VehicleSummary(
+        id=vehicle.id,
+        vehicle_number=vehicle.vehicle_number,
+        owner_name=vehicle.owner_name,
+        owner_address=vehicle.owner_address,
+        make=vehicle.make,
+        model=vehicle.model,
+        year=vehicle.year,
+        damage=vehicle.damage,
+        injuries=vehicle.injuries,
+        insurance_company=vehicle.insurance_company,
+        insurance_policy_number=vehicle.insurance_policy_number,
+        towing_company=vehicle.towing_company,
+        case=case,
+    )
+
+def _crash_summary(crash: CrashReport) -> CrashSummary:
+    return CrashSummary(
+        id=crash.id,
+        filename=crash.filename,
+        incident_summary=crash.incident_summary,
+        crash_date=crash.crash_date,
+        vehicles=[
+            _vehicle_summary(vehicle, _case_summary(vehicle.case) if vehicle.case else None)
+            for vehicle in sorted(crash.vehicles, key=lambda v: v.vehicle_number)
+        ],
+    )
+
+def _parse_crash_date(crash_date: str):
+    return datetime.strptime(crash_date, "%m/%d/%Y").date()
+
+def _insert_ignoring_duplicates(db: Session, model):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's dialect (PostgreSQL or SQLite)"""
+    if db.get_bind().dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+def save_crash_reports(db: Session, reports: List[dict]) -> Dict[str, int]:
+    """Bulk-ingest reports and their vehicles in one transaction.
+
+    Reports whose (filename, crash_date) already exists, or that repeat one
+    earlier in the batch, are skipped via ON CONFLICT DO NOTHING; reports
+    with an unparseable crash date are counted as invalid.
+    Returns counts of inserted, skipped and invalid reports.
+    """
+    counts = {"inserted": 0, "skipped": 0, "invalid": 0}
+    report_rows = {}
+    for report_data in reports:
+        try:
+            crash_date = _parse_crash_date(report_data["crash_date"])
+        except (KeyError, TypeError, ValueError):
+            counts["invalid"] += 1
+            continue
+        key = (report_data["filename"], crash_date)
+        if key in report_rows:
+            counts["skipped"] += 1
+            continue
+        report_rows[key] = report_data
+
+    if not report_rows:
+        return counts
+
+    try:
+        now = datetime.utcnow()
+        rows = [
+            {
+                "filename": filename,
+                "incident_summary": report_data["incident_summary"],
+                "crash_date": crash_date,
+                "created_at": now,
+                "processed_at": now,
+            }
+            for (filename, crash_date), report_data in report_rows.items()
+        ]
+        inserted = []
+        # Chunked to stay under the database's bound-parameter limit
+        for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            stmt = (
+                _insert_ignoring_duplicates(db, CrashReport)
+                .values(rows[start:start + BULK_INSERT_CHUNK_SIZE])
+                .on_conflict_do_nothing(index_elements=["filename", "crash_date"])
+                .returning(CrashReport.id, CrashReport.filename, CrashReport.crash_date)
+            )
+            inserted.extend(db.execute(stmt).all())
+        counts["inserted"] = len(inserted)
+        counts["skipped"] += len(report_rows) - len(inserted)
+
+        vehicle_rows = []
+        for crash_report_id, filename, crash_date in inserted:
+            report_data = report_rows[(filename, crash_date)]
+            for vehicle_number, vehicle_data in enumerate(
+                    [report_data.get("vehicle1"), report_data.get("vehicle2")], start=1):
+                if not vehicle_data:
+                    continue
+                # Normalize the injury text to match enum values
+                injury_text = vehicle_data.get("injuries", "Not specified")
+                if injury_text not in INJURY_STATUSES:
+                    injury_text = 'Not specified'
+                vehicle_rows.append({
+                    "crash_report_id": crash_report_id,
+                    "vehicle_number": vehicle_number,
+                    "owner_name": vehicle_data["owner_name"],
+                    "owner_address": vehicle_data["owner_address"],
+                    "make": vehicle_data["make"],
+                    "model": vehicle_data["model"],
+                    "year": vehicle_data["year"],
+                    "damage": vehicle_data["damage"],
+                    "injuries": injury_text,
+                    "insurance_company": vehicle_data.get("insurance_company"),
+                    "insurance_policy_number": vehicle_data.get("insurance_policy_number"),
+                    "towing_company": vehicle_data.get("towing_company"),
+                    "created_at": now,
+                })
+        if vehicle_rows:
+            db.execute(insert(Vehicle), vehicle_rows)
+
+        # Dashboard rollups are updated in the same transaction as the rows they count
+        apply_deltas(db, crash_report_deltas([crash_date for _, _, crash_date in inserted], vehicle_rows))
+        db.commit()
+        return counts
+    except Exception as e:
+        db.rollback()
+        raise e
 
 def save_crash_report(db: Session, report_data: dict):
-    # Check if report already exists
-    existing_report = db.query(CrashReport).filter(
+    """Save one report (skipping it if it already exists) and return its CrashReport row"""
+    save_crash_reports(db, [report_data])
+    return db.query(CrashReport).filter(
         CrashReport.filename == report_data["filename"],
-        CrashReport.crash_date == datetime.strptime(report_data["crash_date"], "%m/%d/%Y").date()
+        CrashReport.crash_date == _parse_crash_date(report_data["crash_date"])
     ).first()
-    
-    if existing_report:
-        return existing_report  # Skip if already exists
-    
-    # Create crash report
-    crash_report = CrashReport(
-        filename=report_data["filename"],
-        incident_summary=report_data["incident_summary"],
-        crash_date=datetime.strptime(report_data["crash_date"], "%m/%d/%Y").date()
-    )
-    
-    db.add(crash_report)
-    db.flush()
-
-    # Add vehicles
-    for vehicle_data in [report_data.get("vehicle1"), report_data.get("vehicle2")]:
-        if vehicle_data:
-            # Ensure injury text matches enum exactly
-            injury_text = vehicle_data.get("injuries", "Not specified")
-            # Normalize the injury text to match enum values
-            if injury_text not in INJURY_STATUSES:
-                injury_text = 'Not specified'
-            
-            vehicle = Vehicle(
-                crash_report_id=crash_report.id,
-                vehicle_number=1 if vehicle_data == report_data.get("vehicle1") else 2,
-                owner_name=vehicle_data["owner_name"],
-                owner_address=vehicle_data["owner_address"],
-                make=vehicle_data["make"],
-                model=vehicle_data["model"],
-                year=vehicle_data["year"],
-                damage=vehicle_data["damage"],
-                injuries=injury_text,
-                insurance_company=vehicle_data.get("insurance_company"),
-                insurance_policy_number=vehicle_data.get("insurance_policy_number"),
-                towing_company=vehicle_data.get("towing_company")
-            )
-            db.add(vehicle)
-    db.commit()
-    return crash_report
 
-def get_filtered_crashes(db: Session, year_range=None, date_range=None):
-    query = db.query(CrashReport).distinct()
+def build_filtered_crashes_query(db: Session, year_range=None, date_range=None, after: Optional[tuple] = None,
+                                 search: Optional[str] = None):
+    """Query for crash reports matching the filters, newest first, optionally after a (crash_date, id) cursor.
+
+    Every word of ``search`` must match, each in the report summary or in any
+    of its vehicles, so words may be split across fields.
+    """
+    query = db.query(CrashReport)
+
+    if search:
+        terms = _search_terms(db, search)
+        if not terms:
+            query = query.filter(false())
+        for index, term in enumerate(terms):
+            query = query.filter(CrashReport.id.in_(_crash_ids_matching(db, term, f"search_term_{index}")))
     
     if year_range:
         min_year, max_year = year_range
-        query = query.join(Vehicle).filter(
-            Vehicle.year.between(min_year, max_year)
+        # EXISTS rather than JOIN + DISTINCT, so the planner can use ix_vehicles_crash_report_id_year
+        query = query.filter(
+            CrashReport.vehicles.any(Vehicle.year.between(min_year, max_year))
         )
     
     if date_range:
@@ -64,28 +242,147 @@ def get_filtered_crashes(db: Session, year_range=None, date_range=None):
         query = query.filter(
             CrashReport.crash_date.between(start_date, end_date)
         )
+
+    if after:
+        query = query.filter(_keyset_after(CrashReport.crash_date, CrashReport.id, after))
     
     # Add ordering by crash_date in descending order
-    query = query.order_by(CrashReport.crash_date.desc())
-    
-    return query.all() 
+    return query.order_by(CrashReport.crash_date.desc(), CrashReport.id.desc())
 
-def calculate_case_priority(vehicle_damage: str, vehicle_year: int) -> CasePriority:
-    current_year = datetime.now().year
-    
-    # Check if vehicle is less than 10 years old
-    is_recent = (vehicle_year and (current_year - vehicle_year) <= 10)
-    
-    # Check for severe damage keywords
-    severe_keywords = ['severe', 'major', 'totaled', 'extensive', 'heavy', 'significant']
-    has_severe_damage = any(keyword in vehicle_damage.lower() for keyword in severe_keywords)
-    
-    if is_recent and has_severe_damage:
-        return CasePriority.HIGH
-    elif is_recent or has_severe_damage:
-        return CasePriority.MEDIUM
+def get_crashes_page(db: Session, year_range=None, date_range=None, after: Optional[tuple] = None,
+                     page_size: int = DEFAULT_PAGE_SIZE, search: Optional[str] = None) -> Page:
+    """One page of matching crashes (as CrashSummary) after a (crash_date, id) cursor"""
+    page_size = _clamp_page_size(page_size)
+    crashes = (
+        build_filtered_crashes_query(db, year_range, date_range, after, search)
+        .options(selectinload(CrashReport.vehicles).selectinload(Vehicle.case))
+        .limit(page_size + 1)
+        .all()
+    )
+    # The extra row only tells us whether another page exists
+    next_cursor = None
+    if len(crashes) > page_size:
+        crashes = crashes[:page_size]
+        next_cursor = (crashes[-1].crash_date, crashes[-1].id)
+    return Page(items=[_crash_summary(crash) for crash in crashes], next_cursor=next_cursor)
+
+def _search_terms(db: Session, search: str) -> List[str]:
+    """The words of ``search`` as per-term full-text queries for the database in use.
+
+    PostgreSQL gets the stemmed lexemes with stop words dropped, so "the
+    rollover" does not require "the"; SQLite gets each word quoted so
+    punctuation in user input can't be read as FTS5 query syntax.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return db.execute(
+            text("SELECT DISTINCT unnest(tsvector_to_array(to_tsvector('english', :search)))"),
+            {"search": search}
+        ).scalars().all()
+    return ['"' + term.replace('"', '""') + '"' for term in search.split() if any(ch.isalnum() for ch in term)]
+
+def _crash_ids_matching(db: Session, term: str, name: str):
+    """Subquery of crash report ids whose summary, or any vehicle's damage/owner/insurer, matches one term.
+
+    ``term`` comes from _search_terms and is bound as ``name``. Uses the
+    tsvector GIN indexes on PostgreSQL and the FTS5 tables on SQLite, both
+    created in migrations.py.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # The lexeme is already stemmed, so the 'simple' configuration matches it as is
+        sql = (
+            f"SELECT id FROM crash_reports WHERE search_vector @@ plainto_tsquery('simple', :{name}) "
+            f"UNION SELECT crash_report_id FROM vehicles WHERE search_vector @@ plainto_tsquery('simple', :{name})"
+        )
     else:
-        return CasePriority.LOW 
+        sql = (
+            f"SELECT rowid FROM crash_reports_fts WHERE crash_reports_fts MATCH :{name} "
+            f"UNION SELECT vehicles.crash_report_id FROM vehicles_fts "
+            f"JOIN vehicles ON vehicles.id = vehicles_fts.rowid WHERE vehicles_fts MATCH :{name}"
+        )
+    return text(sql).bindparams(**{name: term}).columns(id=Integer)
+
+def search_crashes(db: Session, search: str, year_range=None, date_range=None, after: Optional[tuple] = None,
+                   page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+    """One page of crashes matching a full-text search, newest first, optionally narrowed by the usual filters"""
+    if not search.split():
+        return Page(items=[], next_cursor=None)
+    return get_crashes_page(db, year_range, date_range, after, page_size, search=search)
+
+def build_cases_query(db: Session, after: Optional[tuple] = None):
+    """Query for all cases with their vehicles, newest first, optionally after a (created_at, id) cursor"""
+    query = db.query(Case).join(Vehicle)
+    if after:
+        query = query.filter(_keyset_after(Case.created_at, Case.id, after))
+    return query.order_by(Case.created_at.desc(), Case.id.desc())
+
+def get_cases_page(db: Session, after: Optional[tuple] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Page:
+    """One page of cases (as CaseListItem) after a (created_at, id) cursor"""
+    page_size = _clamp_page_size(page_size)
+    cases = build_cases_query(db, after).options(contains_eager(Case.vehicle)).limit(page_size + 1).all()
+    next_cursor = None
+    if len(cases) > page_size:
+        cases = cases[:page_size]
+        next_cursor = (cases[-1].created_at, cases[-1].id)
+    return Page(
+        items=[CaseListItem(case=_case_summary(case), vehicle=_vehicle_summary(case.vehicle)) for case in cases],
+        next_cursor=next_cursor
+    )
+
+def update_cases(db: Session, edits: List[dict]) -> Dict[str, Any]:
+    """Apply a batch of case edits in one transaction, with optimistic concurrency.
+
+    Each edit is a dict with ``case_id``, ``expected_updated_at`` (the
+    updated_at value the editor saw) and optionally ``status`` and/or
+    ``notes``. An edit only applies if the case still has that updated_at;
+    otherwise someone else changed it first and its id is returned under
+    ``conflicts`` rather than overwriting their change.
+    Returns the number of cases updated and the conflicting case ids.
+    """
+    result = {"updated": 0, "conflicts": []}
+    try:
+        now = datetime.utcnow()
+        # Current statuses, to move the status rollups; a row that changes after this
+        # read also changes updated_at, so its edit below is rejected as a conflict
+        status_ids = [edit["case_id"] for edit in edits if edit.get("status") is not None]
+        old_statuses = dict(
+            db.query(Case.id, Case.status).filter(Case.id.in_(status_ids)).all()
+        ) if status_ids else {}
+        deltas = Counter()
+        for edit in edits:
+            values = {key: edit[key] for key in ("status", "notes") if edit.get(key) is not None}
+            if not values:
+                continue
+            expected = edit["expected_updated_at"]
+            stmt = (
+                update(Case)
+                .where(Case.id == edit["case_id"])
+                .where(Case.updated_at.is_(None) if expected is None else Case.updated_at == expected)
+                .values(updated_at=now, **values)
+            )
+            if db.execute(stmt).rowcount == 1:
+                result["updated"] += 1
+                if "status" in values:
+                    deltas.update(case_deltas(status=old_statuses.get(edit["case_id"]), sign=-1))
+                    deltas.update(case_deltas(status=values["status"]))
+            else:
+                result["conflicts"].append(edit["case_id"])
+        apply_deltas(db, deltas)
+        db.commit()
+        return result
+    except Exception as e:
+        db.rollback()
+        raise e
+
+# Vehicle columns the priority rules read
+PRIORITY_SIGNAL_COLUMNS = (
+    Vehicle.damage, Vehicle.year, Vehicle.injuries, Vehicle.towing_company, Vehicle.insurance_company
+)
+OPEN_CASE_STATUSES = (CaseStatus.NEW, CaseStatus.IN_PROGRESS)
+RESCORE_BATCH_SIZE = 5000
+
+def calculate_case_priority(vehicle_damage: str, vehicle_year: int) -> CasePriority:
+    """Priority from damage and year alone under the configured rules (see priority_rules.py)"""
+    return get_rules().priority(SimpleNamespace(damage=vehicle_damage, year=vehicle_year))
 
 def create_case_for_vehicle(db: Session, vehicle_id: int) -> Case:
     try:
@@ -99,8 +396,8 @@ def create_case_for_vehicle(db: Session, vehicle_id: int) -> Case:
         if not vehicle:
             raise ValueError("Vehicle not found")
         
-        # Calculate priority (will return CasePriority.LOW, MEDIUM, or HIGH)
-        priority = calculate_case_priority(vehicle.damage, vehicle.year)
+        # Score every signal the configured rules use, not just damage and year
+        priority = get_rules().priority(vehicle)
         
         # Create new case (CaseStatus.NEW matches the SQL enum value "NEW")
         case = Case(
@@ -111,10 +408,114 @@ def create_case_for_vehicle(db: Session, vehicle_id: int) -> Case:
         )
         
         db.add(case)
+        apply_deltas(db, case_deltas(status=case.status, priority=priority))
         db.commit()
         db.refresh(case)
         return case
         
     except Exception as e:
         db.rollback()
-        raise e 
\ No newline at end of file
+        raise e
+
+def create_cases_for_selection(db: Session, year_range=None, date_range=None,
+                               search: Optional[str] = None) -> Dict[str, int]:
+    """Create cases for every vehicle in a report selection that does not have one yet.
+
+    The selection is the vehicles of the crashes matching the same filters as
+    get_crashes_page, restricted to vehicles whose own year is in ``year_range``.
+    Priorities are scored for the whole set in one pass and the cases are
+    inserted in bulk; a vehicle that gains a case concurrently is skipped via
+    ON CONFLICT on the unique vehicle_id.
+    Returns the number of cases created and of vehicles skipped.
+    """
+    crash_ids = build_filtered_crashes_query(db, year_range, date_range, search=search) \
+        .with_entities(CrashReport.id).order_by(None)
+    query = db.query(
+        Vehicle.id, Vehicle.make, Vehicle.model, *PRIORITY_SIGNAL_COLUMNS
+    ).filter(
+        Vehicle.crash_report_id.in_(crash_ids.statement),
+        ~Vehicle.case.has()
+    )
+    if year_range:
+        query = query.filter(Vehicle.year.between(*year_range))
+
+    try:
+        vehicles = query.all()
+        if not vehicles:
+            return {"created": 0, "skipped": 0}
+
+        priorities = get_rules().score_batch(vehicles)
+        now = datetime.utcnow()
+        rows = [
+            {
+                "vehicle_id": vehicle.id,
+                "status": CaseStatus.NEW,
+                "priority": priority,
+                "notes": f"Initial case created for {vehicle.make} {vehicle.model} ({vehicle.year})",
+                "created_at": now,
+            }
+            for vehicle, priority in zip(vehicles, priorities)
+        ]
+
+        created = []
+        # Chunked to stay under the database's bound-parameter limit
+        for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            stmt = (
+                _insert_ignoring_duplicates(db, Case)
+                .values(rows[start:start + BULK_INSERT_CHUNK_SIZE])
+                .on_conflict_do_nothing(index_elements=["vehicle_id"])
+                .returning(Case.priority)
+            )
+            created.extend(priority for (priority,) in db.execute(stmt))
+
+        deltas = Counter()
+        for priority in created:
+            deltas.update(case_deltas(status=CaseStatus.NEW, priority=priority))
+        apply_deltas(db, deltas)
+        db.commit()
+        return {"created": len(created), "skipped": len(rows) - len(created)}
+    except Exception as e:
+        db.rollback()
+        raise e
+
+def rescore_open_cases(db: Session, rules: Optional[PriorityRules] = None) -> Dict[str, int]:
+    """Re-apply the priority rules to every open (new or in-progress) case, e.g. after a rule change.
+
+    Scores in batches and writes only changed priorities, as one executemany
+    UPDATE per batch, in a single transaction. updated_at is left alone so a
+    re-score never makes a dispatcher's pending edit look like a conflict.
+    Returns the number of open cases scored and changed.
+    """
+    rules = rules or get_rules()
+    try:
+        cases = (
+            db.query(Case.id, Case.priority, *PRIORITY_SIGNAL_COLUMNS)
+            .join(Vehicle, Case.vehicle_id == Vehicle.id)
+            .filter(Case.status.in_(OPEN_CASE_STATUSES))
+            .all()
+        )
+        changed = 0
+        deltas = Counter()
+        for start in range(0, len(cases), RESCORE_BATCH_SIZE):
+            batch = cases[start:start + RESCORE_BATCH_SIZE]
+            updates = []
+            for case, priority in zip(batch, rules.score_batch(batch)):
+                if priority != case.priority:
+                    updates.append({"case_id": case.id, "new_priority": priority})
+                    deltas.update(case_deltas(priority=case.priority, sign=-1))
+                    deltas.update(case_deltas(priority=priority))
+            if updates:
+                db.execute(
+                    update(Case.__table__)
+                    .where(Case.__table__.c.id == bindparam("case_id"))
+                    # Setting updated_at to itself stops its onupdate default from bumping it
+                    .values(priority=bindparam("new_priority"), updated_at=Case.__table__.c.updated_at),
+                    updates
+                )
+                changed += len(updates)
+        apply_deltas(db, deltas)
+        db.commit()
+        return {"scored": len(cases), "changed": changed}
+    except Exception as e:
+        db.rollback()
+        raise e
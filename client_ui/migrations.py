@@ -0,0 +1,168 @@
+import logging
+from datetime import datetime
+from typing import Callable, List, Union
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the PostgreSQL advisory lock that serializes concurrent migration runs
+MIGRATION_LOCK_KEY = 727001
+# Duplicate groups listed when a unique index cannot be created
+MAX_REPORTED_DUPLICATES = 20
+
+Step = Union[str, Callable[[Connection], None]]
+
+def _baseline(conn: Connection):
+    """Create any missing tables from the current models (fresh databases start here)"""
+    from database import Base
+    Base.metadata.create_all(bind=conn)
+
+def _index(name: str, table: str, columns: str, unique: bool = False) -> str:
+    return f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+
+def _require_unique(index: str, table: str, columns: str) -> Step:
+    """Step that stops the migration with a list of the offending rows if ``columns`` hold duplicates.
+
+    Duplicates may have children (vehicles, dispatcher notes), so they are
+    left for an operator to merge rather than deleted here.
+    """
+    names = [column.strip() for column in columns.split(",")]
+    not_null = " AND ".join(f"{name} IS NOT NULL" for name in names)
+
+    def check(conn: Connection):
+        groups = conn.execute(text(
+            f"SELECT {columns} FROM {table} WHERE {not_null} "
+            f"GROUP BY {columns} HAVING COUNT(*) > 1 ORDER BY {columns} LIMIT {MAX_REPORTED_DUPLICATES + 1}"
+        )).all()
+        if not groups:
+            return
+        lines = []
+        for group in groups[:MAX_REPORTED_DUPLICATES]:
+            match = " AND ".join(f"{name} = :{name}" for name in names)
+            ids = conn.execute(
+                text(f"SELECT id FROM {table} WHERE {match} ORDER BY id"), dict(zip(names, group))
+            ).scalars().all()
+            key = ", ".join(f"{name}={value!r}" for name, value in zip(names, group))
+            lines.append(f"  {key}: ids {', '.join(str(row_id) for row_id in ids)}")
+        if len(groups) > MAX_REPORTED_DUPLICATES:
+            lines.append(f"  ... and more (first {MAX_REPORTED_DUPLICATES} shown)")
+        raise RuntimeError(
+            f"Cannot create unique index {index}: {table} has duplicate ({columns}) rows. "
+            f"Merge or delete the duplicates, then restart.\n" + "\n".join(lines)
+        )
+
+    return check
+
+# Text searched by db_operations.search_crashes: the report narrative, and per vehicle
+# the damage description, owner and insurer
+CRASH_SEARCH_COLUMNS = ["incident_summary"]
+VEHICLE_SEARCH_COLUMNS = ["damage", "owner_name", "owner_address", "insurance_company"]
+
+def _tsvector(columns: List[str]) -> str:
+    return "to_tsvector('english', " + " || ' ' || ".join(f"coalesce({column}, '')" for column in columns) + ")"
+
+def _fts5_table(conn: Connection, table: str, columns: List[str]):
+    """External-content FTS5 index over ``table`` kept in sync by triggers, then backfilled"""
+    fts = f"{table}_fts"
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    delete_old = f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {new_values});"
+    conn.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{names}, content='{table}', content_rowid='id', tokenize='porter unicode61')"
+    ))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert_new} END"))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete_old} END"))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table} "
+        f"BEGIN {delete_old} {insert_new} END"
+    ))
+    conn.execute(text(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')"))
+
+def _full_text_search(conn: Connection):
+    """Generated tsvector columns with GIN indexes on PostgreSQL, FTS5 tables on SQLite"""
+    if conn.dialect.name == "postgresql":
+        for table, columns in (("crash_reports", CRASH_SEARCH_COLUMNS), ("vehicles", VEHICLE_SEARCH_COLUMNS)):
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS ({_tsvector(columns)}) STORED"
+            ))
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING GIN (search_vector)"))
+    else:
+        _fts5_table(conn, "crash_reports", CRASH_SEARCH_COLUMNS)
+        _fts5_table(conn, "vehicles", VEHICLE_SEARCH_COLUMNS)
+
+def _stat_rollups(conn: Connection):
+    """Create the dashboard rollup table and backfill it from existing rows"""
+    from sqlalchemy.orm import Session
+    from database import StatRollup
+    from stats import replace_rollups
+    StatRollup.__table__.create(bind=conn, checkfirst=True)
+    with Session(bind=conn) as db:
+        replace_rollups(db)
+
+# (version, description, steps); steps are SQL strings or callables run in one transaction.
+# Never edit an applied migration: append a new one.
+MIGRATIONS: List[tuple[int, str, List[Step]]] = [
+    (1, "Baseline schema", [_baseline]),
+    (2, "Unique crash report natural key", [
+        _require_unique("uq_crash_reports_filename_crash_date", "crash_reports", "filename, crash_date"),
+        _index("uq_crash_reports_filename_crash_date", "crash_reports", "filename, crash_date", unique=True),
+    ]),
+    (3, "Indexes for report filters, joins and case listing", [
+        _index("ix_crash_reports_crash_date_id", "crash_reports", "crash_date, id"),
+        _index("ix_vehicles_crash_report_id_year", "vehicles", "crash_report_id, year"),
+        _index("ix_vehicles_year", "vehicles", "year"),
+        _require_unique("uq_cases_vehicle_id", "cases", "vehicle_id"),
+        _index("uq_cases_vehicle_id", "cases", "vehicle_id", unique=True),
+        _index("ix_cases_created_at_id", "cases", "created_at, id"),
+    ]),
+    (4, "Full-text search over report summaries and vehicle damage, owner and insurer", [_full_text_search]),
+    (5, "Incrementally maintained dashboard statistics", [_stat_rollups]),
+]
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def current_version(engine: Engine) -> int:
+    """Return the highest applied migration version, or 0 for an unmigrated database"""
+    if not inspect(engine).has_table("schema_migrations"):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+def run_migrations(engine: Engine) -> int:
+    """Apply pending migrations in order, each in its own transaction; returns the new version"""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+
+    for version, description, steps in MIGRATIONS:
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                # Held until this transaction ends, so concurrent app starts apply each migration once
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            applied = conn.execute(
+                text("SELECT 1 FROM schema_migrations WHERE version = :version"), {"version": version}
+            ).first()
+            if applied:
+                continue
+            logger.info(f"Applying migration {version}: {description}")
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) "
+                     "VALUES (:version, :description, :applied_at)"),
+                {"version": version, "description": description, "applied_at": datetime.utcnow()}
+            )
+    return MIGRATIONS[-1][0]
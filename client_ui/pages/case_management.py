@@ -1,6 +1,8 @@
 import streamlit as st
-from database import SessionLocal, Case, CaseStatus, Vehicle
-from datetime import datetime
+from database import SessionLocal, CaseStatus
+from db_operations import get_cases_page, update_cases, rescore_open_cases
+from priority_rules import reload_rules
+from pagination import current_cursor, page_controls, page_size_selector
 
 st.title("Case Management")
 
@@ -11,52 +13,109 @@ def format_status_display(status):
     """Convert enum value to display format (e.g., IN_PROGRESS -> In Progress)"""
     return status.value.replace("_", " ")
 
+def save_case_edits(cases):
+    """Form submit callback: apply every changed status and note on the page in one transaction.
+
+    Runs before the rerun, so the page then renders the saved values without an extra reload.
+    """
+    edits = []
+    for case in cases:
+        edit = {"case_id": case.id, "expected_updated_at": case.updated_at}
+        status = st.session_state.get(f"status_{case.id}", case.status)
+        if status != case.status:
+            edit["status"] = status
+        notes = st.session_state.get(f"notes_{case.id}", case.notes or "")
+        if notes != (case.notes or ""):
+            edit["notes"] = notes
+        if len(edit) > 2:
+            edits.append(edit)
+
+    if not edits:
+        st.session_state.case_save_result = ("info", "No changes to save.")
+        return
+
+    edit_db = SessionLocal()
+    try:
+        result = update_cases(edit_db, edits)
+    except Exception as e:
+        st.session_state.case_save_result = ("error", f"Error saving changes: {str(e)}")
+        return
+    finally:
+        edit_db.close()
+
+    # Drop the stale inputs of conflicting cases so they show what is now stored
+    for case_id in result["conflicts"]:
+        st.session_state.pop(f"status_{case_id}", None)
+        st.session_state.pop(f"notes_{case_id}", None)
+    if result["conflicts"]:
+        st.session_state.case_save_result = (
+            "warning",
+            f"Saved {result['updated']} case(s). {len(result['conflicts'])} case(s) were changed by "
+            "someone else in the meantime and were not saved; they now show the latest values."
+        )
+    else:
+        st.session_state.case_save_result = ("success", f"Saved {result['updated']} case(s).")
+
 try:
-    # Get all cases
-    cases = db.query(Case).join(Vehicle).order_by(Case.created_at.desc()).all()
+    # After editing the priority rules configuration, apply it to every open case
+    if st.button("Re-score Open Cases"):
+        try:
+            result = rescore_open_cases(db, reload_rules())
+            st.success(f"Re-scored {result['scored']} open case(s); {result['changed']} changed priority.")
+        except Exception as e:
+            st.error(f"Error re-scoring cases: {str(e)}")
+
+    # Get one page of cases, newest first
+    page_size = page_size_selector("cases")
+    page = get_cases_page(db, after=current_cursor("cases"), page_size=page_size)
+    cases = page.items
     
+    if "case_save_result" in st.session_state:
+        level, message = st.session_state.pop("case_save_result")
+        getattr(st, level)(message)
+
     if not cases:
         st.info("No active cases found.")
     else:
-        for case in cases:
-            with st.expander(f"{case.vehicle.make} {case.vehicle.model} - {format_status_display(case.status)}"):
-                col1, col2 = st.columns([3, 1])
-                
-                with col1:
-                    st.write(f"""
-                    **Vehicle Details:**
-                    - Owner: {case.vehicle.owner_name}
-                    - Vehicle: {case.vehicle.year} {case.vehicle.make} {case.vehicle.model}
-                    - Damage: {case.vehicle.damage}
-                    - Priority: {case.priority.value}
-                    """)
-                
-                with col2:
-                    new_status = st.selectbox(
-                        "Status",
-                        options=[status for status in CaseStatus],
-                        key=f"status_{case.id}",
-                        index=[status for status in CaseStatus].index(case.status),
-                        format_func=lambda x: format_status_display(x)
-                    )
+        # Edits are collected in a form and written together when it is submitted
+        with st.form("case_edits"):
+            for item in cases:
+                case, vehicle = item.case, item.vehicle
+                with st.expander(f"{vehicle.make} {vehicle.model} - {format_status_display(case.status)}"):
+                    col1, col2 = st.columns([3, 1])
+                    
+                    with col1:
+                        st.write(f"""
+                        **Vehicle Details:**
+                        - Owner: {vehicle.owner_name}
+                        - Vehicle: {vehicle.year} {vehicle.make} {vehicle.model}
+                        - Damage: {vehicle.damage}
+                        - Priority: {case.priority.value}
+                        """)
+                    
+                    with col2:
+                        st.selectbox(
+                            "Status",
+                            options=[status for status in CaseStatus],
+                            key=f"status_{case.id}",
+                            index=[status for status in CaseStatus].index(case.status),
+                            format_func=lambda x: format_status_display(x)
+                        )
                     
-                    if new_status != case.status:
-                        case.status = new_status
-                        case.updated_at = datetime.utcnow()
-                        db.commit()
-                        st.rerun()
-                
-                # Notes section
-                notes = st.text_area(
-                    "Case Notes",
-                    value=case.notes or "",
-                    key=f"notes_{case.id}"
-                )
-                
-                if notes != case.notes:
-                    case.notes = notes
-                    case.updated_at = datetime.utcnow()
-                    db.commit()
+                    # Notes section
+                    st.text_area(
+                        "Case Notes",
+                        value=case.notes or "",
+                        key=f"notes_{case.id}"
+                    )
+
+            st.form_submit_button(
+                "Save changes",
+                on_click=save_case_edits,
+                args=([item.case for item in cases],)
+            )
+
+        page_controls("cases", page.next_cursor)
 
 finally:
-    db.close() 
\ No newline at end of file
+    db.close()
@@ -0,0 +1,43 @@
+import streamlit as st
+import pandas as pd
+from database import SessionLocal
+from stats import get_stats
+
+st.title("Statistics")
+
+days = st.slider("Days to show", min_value=7, max_value=365, value=30)
+
+db = SessionLocal()
+try:
+    # Reads the rollup table only, so this stays cheap however many reports are stored
+    stats = get_stats(db, days=days)
+finally:
+    db.close()
+
+st.subheader("Crashes per Day")
+crashes_per_day = pd.DataFrame(stats["crashes_per_day"]).set_index("date")
+st.bar_chart(crashes_per_day["count"])
+
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Injuries")
+    st.bar_chart(pd.Series(stats["injuries"], name="vehicles"))
+with col2:
+    st.subheader("Cases by Status")
+    st.bar_chart(pd.Series(stats["case_status"], name="cases"))
+    st.subheader("Cases by Priority")
+    st.bar_chart(pd.Series(stats["case_priority"], name="cases"))
+
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Top Towing Companies")
+    if stats["top_towing_companies"]:
+        st.dataframe(pd.DataFrame(stats["top_towing_companies"]), hide_index=True)
+    else:
+        st.info("No towing companies recorded yet.")
+with col2:
+    st.subheader("Top Insurers")
+    if stats["top_insurers"]:
+        st.dataframe(pd.DataFrame(stats["top_insurers"]), hide_index=True)
+    else:
+        st.info("No insurers recorded yet.")
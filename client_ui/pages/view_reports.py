@@ -1,13 +1,21 @@
 import streamlit as st
 from database import SessionLocal
-from db_operations import get_filtered_crashes, create_case_for_vehicle
+from db_operations import get_crashes_page, search_crashes, create_case_for_vehicle, create_cases_for_selection
 from datetime import datetime, date, timedelta
 from app import reset_session_state
-from database import Vehicle, Case
-from sqlalchemy.orm import Session
+from pagination import current_cursor, page_controls, page_size_selector, reset_pages
 
 st.title("View Crash Reports")
 
+# Full-text search across every report; a new search starts from the first page
+search = st.text_input(
+    "Search reports",
+    placeholder="Street name, damage such as \"rollover\", owner or insurer",
+    key="crash_search",
+    on_change=reset_pages,
+    args=("crashes",)
+).strip()
+
 # Calculate default dates (last 14 days)
 end_date = date.today()
 start_date = end_date - timedelta(days=14)
@@ -44,21 +52,38 @@ with col2:
 # Initialize database connection
 db = SessionLocal()
 try:
-    # If filter button is clicked, use filtered results
+    # If filter button is clicked, use filtered results from the first page on
     if st.button("Apply Filters"):
         reset_session_state()
-        crashes = get_filtered_crashes(
-            db, 
-            year_range=(min_year, max_year),
-            date_range=(start_date, end_date)
-        )
+        st.session_state.crash_filters = {
+            "year_range": (min_year, max_year),
+            "date_range": (start_date, end_date),
+        }
+    # Otherwise show crashes from last 14 days by default
+    filters = st.session_state.get("crash_filters", {
+        "year_range": (default_min_year, current_year),
+        "date_range": (start_date, end_date),
+    })
+
+    # One bulk insert for every matching vehicle without a case
+    if st.button("Create Cases for All Matching Vehicles"):
+        try:
+            selection = {"search": search} if search else filters
+            result = create_cases_for_selection(db, **selection)
+            if result["created"]:
+                st.success(f"Created {result['created']} case(s).")
+            else:
+                st.info("Every matching vehicle already has a case.")
+        except Exception as e:
+            st.error(f"Error creating cases: {str(e)}")
+
+    page_size = page_size_selector("crashes")
+    if search:
+        st.caption("Searching all reports; the date and year filters are not applied.")
+        page = search_crashes(db, search, after=current_cursor("crashes"), page_size=page_size)
     else:
-        # Otherwise show crashes from last 14 days by default
-        crashes = get_filtered_crashes(
-            db,
-            year_range=(default_min_year, current_year),
-            date_range=(start_date, end_date)
-        )
+        page = get_crashes_page(db, after=current_cursor("crashes"), page_size=page_size, **filters)
+    crashes = page.items
     
     if not crashes:
         st.info("No crash reports found matching the criteria.")
@@ -80,7 +105,7 @@ try:
                         - Injuries: {vehicle.injuries}
                         """)
                     with col2:
-                        if not hasattr(vehicle, 'case') or vehicle.case is None:
+                        if vehicle.case is None:
                             if st.button("Create Case", key=f"create_case_{vehicle.id}"):
                                 try:
                                     case = create_case_for_vehicle(db, vehicle.id)
@@ -91,5 +116,6 @@ try:
                         else:
                             st.info(f"Case exists - {vehicle.case.status.value}")
                             st.write(f"Priority: {vehicle.case.priority.value}")
+        page_controls("crashes", page.next_cursor)
 finally:
     db.close() 
\ No newline at end of file
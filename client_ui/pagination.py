@@ -0,0 +1,51 @@
+import os
+from typing import Optional
+import streamlit as st
+from db_operations import DEFAULT_PAGE_SIZE
+
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+UI_PAGE_SIZE = int(os.getenv("UI_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+
+def _cursors_key(name: str) -> str:
+    return f"{name}_page_cursors"
+
+def reset_pages(name: str):
+    """Go back to the first page of a listing"""
+    st.session_state[_cursors_key(name)] = [None]
+
+def current_cursor(name: str) -> Optional[tuple]:
+    """Cursor of the page being shown; the stack holds one cursor per page visited, first page is None"""
+    if _cursors_key(name) not in st.session_state:
+        reset_pages(name)
+    return st.session_state[_cursors_key(name)][-1]
+
+def page_size_selector(name: str) -> int:
+    """Page size picker; changing it starts the listing over from the first page"""
+    options = sorted(set(PAGE_SIZE_OPTIONS + [UI_PAGE_SIZE]))
+    return st.selectbox(
+        "Results per page",
+        options=options,
+        index=options.index(UI_PAGE_SIZE),
+        key=f"{name}_page_size",
+        on_change=reset_pages,
+        args=(name,)
+    )
+
+def _next_page(name: str, cursor: tuple):
+    st.session_state[_cursors_key(name)].append(cursor)
+
+def _previous_page(name: str):
+    st.session_state[_cursors_key(name)].pop()
+
+def page_controls(name: str, next_cursor: Optional[tuple]):
+    """Previous/next buttons for a listing paginated with the cursor stack"""
+    cursors = st.session_state[_cursors_key(name)]
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("Previous", key=f"{name}_previous", disabled=len(cursors) <= 1,
+                  on_click=_previous_page, args=(name,))
+    with col2:
+        st.write(f"Page {len(cursors)}")
+    with col3:
+        st.button("Next", key=f"{name}_next", disabled=next_cursor is None,
+                  on_click=_next_page, args=(name, next_cursor))
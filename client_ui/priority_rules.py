@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from database import CasePriority
+from stats import UNNAMED_COMPANY_VALUES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "priority_rules.json")
+
+# Used when no config file exists; reproduces the original hardcoded rules
+# (severe damage keyword and/or a vehicle at most ten years old)
+DEFAULT_RULES = {
+    "damage_keywords": {
+        "severe": 1, "major": 1, "totaled": 1, "extensive": 1, "heavy": 1, "significant": 1
+    },
+    "vehicle_age": {"max_years": 10, "weight": 1},
+    "injuries": {},
+    "towing_present": 0,
+    "insurer_present": 0,
+    "insurers": {},
+    "thresholds": {"HIGH": 2, "MEDIUM": 1},
+}
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation of ``words`` factored into a prefix trie.
+
+    Python's re tries the alternatives of a flat ``a|b|c`` one by one at every
+    position; sharing prefixes keeps the per-position work small even for
+    hundreds of keywords. Longer words win over their prefixes.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+class KeywordMatcher:
+    """Case-insensitive substring matcher for many weighted keywords, compiled into one regex.
+
+    ``weight(text)`` returns the highest weight among the keywords found in
+    ``text`` (0 if none). Text is lowercased once rather than per keyword.
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        self.weights = {keyword.lower(): weight for keyword, weight in weights.items() if keyword}
+        self.max_weight = max(self.weights.values(), default=0)
+        # The trie reports only the longest keyword at each offset; the others found there are
+        # its prefixes, so each keyword stands for the heaviest of itself and its keyword prefixes
+        self.match_weights = {
+            keyword: max(self.weights.get(keyword[:end], weight) for end in range(1, len(keyword) + 1))
+            for keyword, weight in self.weights.items()
+        }
+        self.pattern = None
+        self.overlapping = None
+        if self.weights:
+            pattern = _trie_pattern(self.weights)
+            self.pattern = re.compile(pattern)
+            # With mixed weights, a heavier keyword may overlap a lighter one found first;
+            # the zero-width lookahead variant reports a match at every starting offset
+            if len(set(self.weights.values())) > 1:
+                self.overlapping = re.compile(f"(?=({pattern}))")
+
+    def weight(self, text: Optional[str]) -> float:
+        if not text or self.pattern is None:
+            return 0
+        text = text.lower()
+        if self.overlapping is None:
+            return self.max_weight if self.pattern.search(text) else 0
+        best = 0
+        for match in self.overlapping.finditer(text):
+            best = max(best, self.match_weights[match.group(1)])
+            if best >= self.max_weight:
+                break
+        return best
+
+class PriorityRules:
+    """Weighted priority rules; a vehicle's score is the sum of its signals' weights.
+
+    Signals: damage keywords (highest matching weight), vehicle age, injury
+    status, a named towing company, a named insurer and per-insurer weights.
+    The priority is the highest level whose threshold the score reaches.
+    """
+
+    def __init__(self, config: Dict):
+        self.config = config
+        self.damage = KeywordMatcher(config.get("damage_keywords", {}))
+        vehicle_age = config.get("vehicle_age", {})
+        self.max_vehicle_age = vehicle_age.get("max_years")
+        self.vehicle_age_weight = vehicle_age.get("weight", 0)
+        self.injury_weights = config.get("injuries", {})
+        self.towing_weight = config.get("towing_present", 0)
+        self.insurer_present_weight = config.get("insurer_present", 0)
+        self.insurers = KeywordMatcher(config.get("insurers", {}))
+
+        thresholds = config.get("thresholds", {})
+        unknown = set(thresholds) - {priority.name for priority in CasePriority}
+        if unknown:
+            raise ValueError(f"Unknown priority levels in thresholds: {', '.join(sorted(unknown))}")
+        # Highest threshold first; a null threshold disables that level
+        self.thresholds = sorted(
+            ((value, CasePriority[name]) for name, value in thresholds.items() if value is not None),
+            key=lambda item: item[0], reverse=True
+        )
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "PriorityRules":
+        """Load rules from a JSON file (PRIORITY_RULES_PATH, else priority_rules.json), or the defaults"""
+        path = path or os.getenv("PRIORITY_RULES_PATH", DEFAULT_RULES_PATH)
+        if not os.path.exists(path):
+            logger.info(f"No priority rules at {path}; using the built-in defaults")
+            return cls(DEFAULT_RULES)
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def score(self, vehicle, current_year: Optional[int] = None) -> float:
+        """Score one vehicle; any object with damage, year, injuries, towing_company and insurance_company"""
+        current_year = current_year or datetime.now().year
+        score = self.damage.weight(getattr(vehicle, "damage", None))
+        year = getattr(vehicle, "year", None)
+        if year and self.max_vehicle_age is not None and current_year - year <= self.max_vehicle_age:
+            score += self.vehicle_age_weight
+        score += self.injury_weights.get(getattr(vehicle, "injuries", None), 0)
+        if self.towing_weight and _named(getattr(vehicle, "towing_company", None)):
+            score += self.towing_weight
+        insurer = getattr(vehicle, "insurance_company", None)
+        if _named(insurer):
+            score += self.insurer_present_weight + self.insurers.weight(insurer)
+        return score
+
+    def priority_for_score(self, score: float) -> CasePriority:
+        for threshold, priority in self.thresholds:
+            if score >= threshold:
+                return priority
+        return CasePriority.LOW
+
+    def priority(self, vehicle) -> CasePriority:
+        return self.priority_for_score(self.score(vehicle))
+
+    def score_batch(self, vehicles: Iterable) -> List[CasePriority]:
+        """Priorities for many vehicles, sharing the per-call setup"""
+        current_year = datetime.now().year
+        return [self.priority_for_score(self.score(vehicle, current_year)) for vehicle in vehicles]
+
+def _named(value: Optional[str]) -> bool:
+    return value is not None and value.strip().lower() not in UNNAMED_COMPANY_VALUES
+
+_rules: Optional[PriorityRules] = None
+_rules_lock = threading.Lock()
+
+def get_rules() -> PriorityRules:
+    """Return the process-wide rules, loading them on first use"""
+    global _rules
+    with _rules_lock:
+        if _rules is None:
+            _rules = PriorityRules.load()
+        return _rules
+
+def reload_rules() -> PriorityRules:
+    """Re-read the rules configuration, e.g. after editing it, before re-scoring cases"""
+    global _rules
+    rules = PriorityRules.load()
+    with _rules_lock:
+        _rules = rules
+    return rules
@@ -0,0 +1,133 @@
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from database import CrashReport, Vehicle, Case, StatRollup, INJURY_STATUSES, CaseStatus, CasePriority
+
+# Rollup metrics kept in stat_rollups; each bucket holds a running count
+CRASHES_PER_DAY = "crashes_per_day"
+INJURIES = "injuries"
+CASE_STATUS = "case_status"
+CASE_PRIORITY = "case_priority"
+TOWING_COMPANIES = "towing_company"
+INSURERS = "insurance_company"
+
+UPSERT_CHUNK_SIZE = 1000
+# Placeholder values the analysis uses when a company is not named in the report
+UNNAMED_COMPANY_VALUES = {"", "none", "n/a", "na", "unknown", "not specified", "not provided", "null"}
+
+def _company_bucket(name: Optional[str]) -> Optional[str]:
+    if name is None or name.strip().lower() in UNNAMED_COMPANY_VALUES:
+        return None
+    return name.strip()[:255]
+
+def _enum_value(value) -> str:
+    return value.value if hasattr(value, "value") else str(value)
+
+def crash_report_deltas(crash_dates: Iterable[date], vehicles: Iterable[dict]) -> Counter:
+    """Counter increments for newly saved reports (by crash date) and their vehicle rows"""
+    deltas = Counter()
+    for crash_date in crash_dates:
+        deltas[(CRASHES_PER_DAY, crash_date.isoformat())] += 1
+    for vehicle in vehicles:
+        deltas[(INJURIES, vehicle["injuries"])] += 1
+        for metric, field in ((TOWING_COMPANIES, "towing_company"), (INSURERS, "insurance_company")):
+            bucket = _company_bucket(vehicle.get(field))
+            if bucket:
+                deltas[(metric, bucket)] += 1
+    return deltas
+
+def case_deltas(status=None, priority=None, sign: int = 1) -> Counter:
+    """Counter increments for a case entering (sign=1) or leaving (sign=-1) a status and/or priority"""
+    deltas = Counter()
+    if status is not None:
+        deltas[(CASE_STATUS, _enum_value(status))] += sign
+    if priority is not None:
+        deltas[(CASE_PRIORITY, _enum_value(priority))] += sign
+    return deltas
+
+def apply_deltas(db: Session, deltas: Counter):
+    """Add the deltas to stat_rollups with one upsert per chunk, inside the caller's transaction"""
+    rows = [
+        {"metric": metric, "bucket": bucket, "value": value}
+        for (metric, bucket), value in deltas.items() if value
+    ]
+    if not rows:
+        return
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(StatRollup).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["metric", "bucket"],
+            set_={"value": StatRollup.value + stmt.excluded.value}
+        )
+        db.execute(stmt)
+
+def replace_rollups(db: Session):
+    """Recompute every rollup from the base tables, inside the caller's transaction"""
+    deltas = Counter()
+    for crash_date, count in db.execute(
+            select(CrashReport.crash_date, func.count()).group_by(CrashReport.crash_date)):
+        deltas[(CRASHES_PER_DAY, crash_date.isoformat())] += count
+    for metric, column in ((INJURIES, Vehicle.injuries),
+                           (TOWING_COMPANIES, Vehicle.towing_company),
+                           (INSURERS, Vehicle.insurance_company)):
+        for bucket, count in db.execute(select(column, func.count()).group_by(column)):
+            if metric != INJURIES:
+                bucket = _company_bucket(bucket)
+            if bucket:
+                deltas[(metric, bucket)] += count
+    for metric, column in ((CASE_STATUS, Case.status), (CASE_PRIORITY, Case.priority)):
+        for bucket, count in db.execute(select(column, func.count()).group_by(column)):
+            if bucket is not None:
+                deltas[(metric, _enum_value(bucket))] += count
+
+    db.execute(delete(StatRollup))
+    apply_deltas(db, deltas)
+
+def rebuild_stats(db: Session):
+    """Recompute every rollup from the base tables (backfill, or repair after manual edits)"""
+    try:
+        replace_rollups(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise e
+
+def _buckets(db: Session, metric: str) -> Dict[str, int]:
+    rows = db.execute(select(StatRollup.bucket, StatRollup.value).where(StatRollup.metric == metric))
+    return {bucket: value for bucket, value in rows}
+
+def _top(db: Session, metric: str, limit: int) -> List[Dict]:
+    rows = db.execute(
+        select(StatRollup.bucket, StatRollup.value)
+        .where(StatRollup.metric == metric, StatRollup.value > 0)
+        .order_by(StatRollup.value.desc(), StatRollup.bucket)
+        .limit(limit)
+    )
+    return [{"name": bucket, "count": value} for bucket, value in rows]
+
+def get_stats(db: Session, days: int = 30, top_n: int = 10) -> Dict:
+    """Dashboard statistics read straight from the rollups (a few small indexed reads)"""
+    first_day = date.today() - timedelta(days=days - 1)
+    per_day = dict(db.execute(
+        select(StatRollup.bucket, StatRollup.value)
+        .where(StatRollup.metric == CRASHES_PER_DAY, StatRollup.bucket >= first_day.isoformat())
+    ).all())
+    injuries = _buckets(db, INJURIES)
+    statuses = _buckets(db, CASE_STATUS)
+    priorities = _buckets(db, CASE_PRIORITY)
+    return {
+        "crashes_per_day": [
+            {"date": day.isoformat(), "count": per_day.get(day.isoformat(), 0)}
+            for day in (first_day + timedelta(days=offset) for offset in range(days))
+        ],
+        "injuries": {status: injuries.get(status, 0) for status in INJURY_STATUSES},
+        "case_status": {status.value: statuses.get(status.value, 0) for status in CaseStatus},
+        "case_priority": {priority.value: priorities.get(priority.value, 0) for priority in CasePriority},
+        "top_towing_companies": _top(db, TOWING_COMPANIES, top_n),
+        "top_insurers": _top(db, INSURERS, top_n),
+    }
@@ -0,0 +1,78 @@
+import pytest
+import database
+from database import Case, CasePriority, CaseStatus, Vehicle
+from db_operations import create_case_for_vehicle, rescore_open_cases, save_crash_reports, search_crashes, update_cases
+from priority_rules import PriorityRules
+
+def vehicle(owner: str, damage: str, insurer: str) -> dict:
+    return {
+        "owner_name": owner,
+        "owner_address": "1 Main St",
+        "make": "Ford",
+        "model": "F-150",
+        "year": 2019,
+        "damage": damage,
+        "injuries": "Not specified",
+        "insurance_company": insurer,
+    }
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Session on a fresh, fully migrated SQLite database"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'crash_reports.db'}")
+    monkeypatch.setattr(database, "_engine", None)
+    session = database.SessionLocal()
+    yield session
+    session.close()
+    database.get_engine().dispose()
+
+@pytest.fixture
+def reports(db):
+    save_crash_reports(db, [
+        {
+            "filename": "rollover.pdf",
+            "incident_summary": "Pickup rollover after leaving the highway",
+            "crash_date": "03/04/2024",
+            "vehicle1": vehicle("Ann Smith", "Roof crushed", "Geico"),
+        },
+        {
+            "filename": "rear_end.pdf",
+            "incident_summary": "Rear-end collision at a red light",
+            "crash_date": "03/05/2024",
+            "vehicle1": vehicle("Bob Jones", "Rear bumper dented", "Geico"),
+            "vehicle2": vehicle("Cy Young", "Front bumper cracked", "Progressive"),
+        },
+    ])
+
+def filenames(page) -> list:
+    return [crash.filename for crash in page.items]
+
+def test_search_matches_terms_across_summary_and_vehicles(db, reports):
+    assert filenames(search_crashes(db, "rollover Geico")) == ["rollover.pdf"]
+
+def test_search_matches_terms_across_vehicles(db, reports):
+    assert filenames(search_crashes(db, "Geico Progressive")) == ["rear_end.pdf"]
+
+def test_search_requires_every_term(db, reports):
+    assert filenames(search_crashes(db, "rollover Progressive")) == []
+    assert filenames(search_crashes(db, "!!")) == []
+
+def test_rescore_keeps_pending_edits_applicable(db, reports):
+    vehicle_id = db.query(Vehicle.id).order_by(Vehicle.id).first()[0]
+    case = create_case_for_vehicle(db, vehicle_id)
+    seen_updated_at = case.updated_at
+    assert case.priority != CasePriority.HIGH
+
+    result = rescore_open_cases(db, PriorityRules({"thresholds": {"HIGH": 0}}))
+    assert result["changed"] == 1
+
+    outcome = update_cases(db, [{
+        "case_id": case.id,
+        "expected_updated_at": seen_updated_at,
+        "status": CaseStatus.IN_PROGRESS,
+        "notes": "Called the owner",
+    }])
+    assert outcome == {"updated": 1, "conflicts": []}
+    db.expire_all()
+    case = db.get(Case, case.id)
+    assert (case.priority, case.status, case.notes) == (CasePriority.HIGH, CaseStatus.IN_PROGRESS, "Called the owner")
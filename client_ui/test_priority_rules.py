@@ -0,0 +1,26 @@
+import pytest
+from types import SimpleNamespace
+from database import CasePriority
+from priority_rules import DEFAULT_RULES, KeywordMatcher, PriorityRules
+
+@pytest.mark.parametrize("weights, text, expected", [
+    ({"severe": 1, "totaled": 1}, "Front end TOTALED", 1),
+    ({"severe": 1, "totaled": 1}, "minor scratches", 0),
+    ({"minor": 1, "severe": 3}, "minor dents, severe frame damage", 3),
+    ({"total": 2, "totaled": 1}, "vehicle totaled", 2),
+    ({"heavy": 3, "heavy damage": 1}, "heavy damage to door", 3),
+    ({"heavy": 1, "heavy damage": 3}, "heavy damage to door", 3),
+    ({"heavy": 1, "heavy damage": 3}, "heavy dent to door", 1),
+    ({"age": 5, "damage": 2}, "damage", 5),
+])
+def test_keyword_matcher_returns_highest_matching_weight(weights, text, expected):
+    assert KeywordMatcher(weights).weight(text) == expected
+    # Reference: check every keyword on its own
+    assert expected == max((weight for keyword, weight in weights.items() if keyword in text.lower()), default=0)
+
+def test_default_rules_reproduce_original_priorities():
+    rules = PriorityRules(DEFAULT_RULES)
+    assert rules.score(SimpleNamespace(damage="severe damage", year=2020), current_year=2024) == 2
+    assert rules.priority_for_score(2) == CasePriority.HIGH
+    assert rules.score(SimpleNamespace(damage="severe damage", year=1990), current_year=2024) == 1
+    assert rules.score(SimpleNamespace(damage="scratches", year=1990), current_year=2024) == 0
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_STORE_PATH = "jobs.db"
+DEFAULT_JOB_LEASE_SECONDS = 600
+
+# Job and file statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+class JobStore:
+    """SQLite-backed queue of analysis jobs that survives service restarts"""
+
+    def __init__(self, path: Optional[str] = None, lease_seconds: Optional[int] = None):
+        """Open (and create if needed) the job database"""
+        self.path = path or os.getenv("JOB_STORE_PATH", DEFAULT_JOB_STORE_PATH)
+        self.lease_seconds = lease_seconds if lease_seconds is not None else int(
+            os.getenv("JOB_LEASE_SECONDS", DEFAULT_JOB_LEASE_SECONDS))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total_files INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_status_created_at ON jobs (status, created_at);
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                content BLOB,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                PRIMARY KEY (job_id, position)
+            );
+        """)
+
+    def create_job(self, pdf_files: List[tuple[str, bytes]]) -> str:
+        """Queue a job for the given (filename, contents) pairs and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, total_files, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, len(pdf_files), now, now)
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_files (job_id, position, filename, content, status) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, position, filename, contents, QUEUED)
+                     for position, (filename, contents) in enumerate(pdf_files)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim_next_job(self) -> Optional[str]:
+        """Atomically mark the oldest queued job (or one whose lease expired) as running"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? OR (status = ? AND updated_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now - self.lease_seconds)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (RUNNING, now, row[0]))
+                self._conn.execute("COMMIT")
+                return row[0]
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def pending_files(self, job_id: str) -> List[tuple[int, str, bytes]]:
+        """Return (position, filename, contents) for files of a job that still need analysis"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT position, filename, content FROM job_files "
+                "WHERE job_id = ? AND status NOT IN (?, ?) ORDER BY position",
+                (job_id, COMPLETED, FAILED)
+            ).fetchall()
+
+    def record_file_result(self, job_id: str, position: int,
+                           result: Optional[Dict] = None, error: Optional[str] = None):
+        """Store the outcome of one file, dropping its contents, and renew the job lease"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE job_files SET status = ?, result = ?, error = ?, content = NULL "
+                    "WHERE job_id = ? AND position = ?",
+                    (FAILED if error is not None else COMPLETED,
+                     json.dumps(result) if result is not None else None,
+                     error, job_id, position)
+                )
+                self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def finish_job(self, job_id: str):
+        """Mark a job completed, or failed if none of its files could be analyzed"""
+        with self._lock:
+            succeeded = self._conn.execute(
+                "SELECT COUNT(*) FROM job_files WHERE job_id = ? AND status = ?", (job_id, COMPLETED)
+            ).fetchone()[0]
+            total = self._conn.execute(
+                "SELECT total_files FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            status = COMPLETED if succeeded or not total else FAILED
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Return a job's status and per-file results, or None if it does not exist"""
+        with self._lock:
+            job = self._conn.execute(
+                "SELECT id, status, total_files, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            files = self._conn.execute(
+                "SELECT filename, status, result, error FROM job_files WHERE job_id = ? ORDER BY position",
+                (job_id,)
+            ).fetchall()
+
+        file_records = []
+        for filename, status, result, error in files:
+            record = {"filename": filename, "status": status}
+            if result is not None:
+                record["result"] = json.loads(result)
+            if error is not None:
+                record["error"] = error
+            file_records.append(record)
+
+        return {
+            "job_id": job[0],
+            "status": job[1],
+            "total_files": job[2],
+            "completed_files": sum(1 for f in file_records if f["status"] in (COMPLETED, FAILED)),
+            "created_at": job[3],
+            "updated_at": job[4],
+            "files": file_records,
+        }
+
+    def queue_depth(self) -> int:
+        """Return the number of jobs waiting to be picked up"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def ping(self) -> bool:
+        """Return True if the job database answers a trivial query"""
+        try:
+            with self._lock:
+                self._conn.execute("SELECT 1").fetchone()
+            return True
+        except Exception as e:
+            logger.error(f"Job store ping failed: {str(e)}")
+            return False
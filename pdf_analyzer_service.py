@@ -1,10 +1,22 @@
-from anthropic import Anthropic
-from PyPDF2 import PdfReader
+from anthropic import Anthropic, AsyncAnthropic
+import asyncio
 import logging
-from typing import Dict, List, Optional, Union
+import re
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Union
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import httpx
+from analysis_cache import AnalysisCache, analysis_cache_key
+from pdf_text import default_char_budget, estimate_tokens, extract_text_with_timings
+from rate_limiter import estimate_request_tokens, get_claude_guard
+from report_pruning import prune_report_text, pruning_enabled
+from prompts import (ANALYSIS_VERSION, CLAUDE_MODEL, REPORT_DELIMITER, USER_PROMPT_PREFIX, cached_system_prompt,
+                     packed_system_prompt, packed_user_message)
 
 # Load environment variables
 load_dotenv()
@@ -13,91 +25,243 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_CONCURRENCY = 5
+DEFAULT_EXTRACTION_WORKERS = 4
+DEFAULT_EXTRACTION_PROCESSES = 0
+DEFAULT_CLAUDE_MAX_CONNECTIONS = 20
+DEFAULT_PACK_MAX_REPORTS = 5
+DEFAULT_PACK_MAX_REPORT_TOKENS = 1500
+DEFAULT_PACK_MAX_TOKENS = 6000
+
+PACKED_SECTION_PATTERN = re.compile(
+    "^" + re.escape(REPORT_DELIMITER).replace(re.escape("{report_id}"), r"(\S+)") + r"\s*$",
+    re.MULTILINE
+)
+
+def message_text(message) -> str:
+    """Concatenate the text blocks of a Claude response"""
+    return "".join(getattr(block, "text", "") for block in message.content)
+
 class PDFAnalyzer:
     """Core service for analyzing PDF crash reports using Claude AI"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[AnalysisCache] = None):
         """Initialize the PDF Analyzer service"""
         self.api_key = os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-        self.anthropic = Anthropic(api_key=self.api_key)
+        # Retries are handled by the shared ClaudeGuard, which also rate-limits and trips a circuit breaker
+        self.anthropic = Anthropic(api_key=self.api_key, max_retries=0)
+        self.guard = get_claude_guard()
+        max_connections = int(os.getenv("CLAUDE_MAX_CONNECTIONS", DEFAULT_CLAUDE_MAX_CONNECTIONS))
+        self.async_anthropic = AsyncAnthropic(
+            api_key=self.api_key,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections)
+            )
+        )
+        # PyPDF2 extraction is CPU-bound, so async callers run it here instead of on the event loop
+        self.extraction_workers = int(os.getenv("EXTRACTION_WORKERS", DEFAULT_EXTRACTION_WORKERS))
+        self.extraction_pool = ThreadPoolExecutor(max_workers=self.extraction_workers,
+                                                  thread_name_prefix="pdf-extract")
+        # Optional process pool for page-parallel extraction of large PDFs (0 disables it)
+        extraction_processes = int(os.getenv("EXTRACTION_PROCESSES", DEFAULT_EXTRACTION_PROCESSES))
+        self.process_pool = None
+        if extraction_processes > 0:
+            self.process_pool = ProcessPoolExecutor(max_workers=extraction_processes,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+        if cache is None and os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true":
+            cache = AnalysisCache()
+        self.cache = cache
+        self.max_chars = default_char_budget()
+        self.prune_enabled = pruning_enabled()
+        self._usage_lock = threading.Lock()
+        self.usage_totals = {
+            "requests": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        }
+
+    @staticmethod
+    def read_pdf_bytes(pdf_file) -> bytes:
+        """Return the raw bytes of a PDF given as bytes, a path or a file-like object"""
+        if isinstance(pdf_file, (bytes, bytearray)):
+            return bytes(pdf_file)
+        if isinstance(pdf_file, str):
+            with open(pdf_file, 'rb') as f:
+                return f.read()
+        if hasattr(pdf_file, 'seek'):
+            pdf_file.seek(0)
+        return pdf_file.read()
 
-    def extract_text_from_pdf(self, pdf_file) -> str:
-        """Extract text content from PDF file"""
+    @staticmethod
+    def cache_key(pdf_bytes: bytes) -> str:
+        """Cache key for a PDF's analysis; changes with the model and the prompt/parser version"""
+        return analysis_cache_key(pdf_bytes, CLAUDE_MODEL, ANALYSIS_VERSION)
+
+    def extract_text_from_pdf(self, pdf_file, max_chars: Optional[int] = None) -> str:
+        """Extract text content from PDF file, stopping at the configured character budget"""
+        text, _ = self.extract_text_with_timings(pdf_file, max_chars=max_chars)
+        return text
+
+    def extract_text_with_timings(self, pdf_file, max_chars: Optional[int] = None) -> tuple[str, List[Dict]]:
+        """Extract text content plus per-page timings, splitting large PDFs across the process pool"""
         try:
-            pdf_reader = PdfReader(pdf_file)
-            text = ""
-            for page in pdf_reader.pages:
-                try:
-                    page_text = page.extract_text()
-                    # Remove or replace problematic characters
-                    text += ''.join(char if ord(char) < 128 else ' ' for char in page_text)
-                    text += "\n"
-                except Exception as e:
-                    logger.error(f"Error processing page: {str(e)}")
-                    continue
-            return text
+            if max_chars is None:
+                max_chars = self.max_chars
+            started = time.perf_counter()
+            text, timings = extract_text_with_timings(
+                self.read_pdf_bytes(pdf_file),
+                max_chars=max_chars,
+                process_pool=self.process_pool
+            )
+            if timings:
+                slowest = max(timings, key=lambda t: t["seconds"])
+                logger.info(
+                    f"Extracted {len(timings)} pages in {time.perf_counter() - started:.2f}s "
+                    f"(slowest: page {slowest['page']}, {slowest['seconds']:.2f}s)"
+                )
+            return text, timings
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             raise
 
+    def prepare_report_text(self, text: str) -> str:
+        """Prune report text to the sections holding the extracted fields, within the token budget"""
+        if not self.prune_enabled:
+            return text
+        pruned, stats = prune_report_text(text)
+        logger.info(
+            f"Report text: ~{stats['original_tokens']} tokens, sending ~{stats['sent_tokens']} "
+            f"({stats['reason']})"
+        )
+        return pruned
+
+    def extract_report_text(self, pdf_file) -> str:
+        """Extract and prune a report's text in one step, for async callers to run on the extraction pool"""
+        return self.prepare_report_text(self.extract_text_from_pdf(pdf_file))
+
+    def build_analysis_request(self, text: str, prepared: bool = False) -> Dict:
+        """Build the messages.create arguments for analyzing report text.
+
+        ``text`` is expected to be normalized already, as returned by
+        extract_text_from_pdf; pass ``prepared=True`` if it has also been
+        through prepare_report_text.
+        """
+        if not prepared:
+            text = self.prepare_report_text(text)
+
+        return {
+            "model": CLAUDE_MODEL,
+            "max_tokens": 4096,
+            "temperature": 0,
+            "system": cached_system_prompt(),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"{USER_PROMPT_PREFIX}{text}"
+                }
+            ]
+        }
+
+    def record_usage(self, usage) -> Dict:
+        """Log one call's token usage, including prompt cache reads/writes, and add it to the totals"""
+        call_usage = {
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        }
+        logger.info(
+            f"Claude usage: {call_usage['input_tokens']} input, {call_usage['output_tokens']} output, "
+            f"{call_usage['cache_read_input_tokens']} cache read, "
+            f"{call_usage['cache_creation_input_tokens']} cache write tokens"
+        )
+        with self._usage_lock:
+            self.usage_totals["requests"] += 1
+            for key, value in call_usage.items():
+                self.usage_totals[key] += value
+        return call_usage
+
+    def usage_stats(self) -> Dict:
+        """Return cumulative token usage across all Claude calls"""
+        with self._usage_lock:
+            return dict(self.usage_totals)
+
     def analyze_with_claude(self, text: str) -> Optional[str]:
         """Send text to Claude for analysis"""
         try:
-            sanitized_text = ''.join(char if ord(char) < 128 else ' ' for char in text)
-            
-            system_prompt = """You are a specialized assistant analyzing automobile crash records.
-Analyze the provided crash report and return ONLY the following information in this EXACT format:
-
-INCIDENT SUMMARY:
-[2-3 sentence summary of the crash]
-
-CRASH DATE: [MM/DD/YYYY format - date only, no time]
-
-VEHICLE 1:
-Owner Name: [full name]
-Owner Address: [complete address]
-Make: [make]
-Model: [model]
-Year: [year]
-Damage: [damage details]
-Injuries: [injury status]
-Insurance Company: [insurance company name]
-Insurance Policy #: [policy number]
-Towing Company: [name of towing company]
-
-VEHICLE 2:
-Owner Name: [full name]
-Owner Address: [complete address]
-Make: [make]
-Model: [model]
-Year: [year]
-Damage: [damage details]
-Injuries: [injury status]
-Insurance Company: [insurance company name]
-Insurance Policy #: [policy number]
-Towing Company: [name of towing company]
-
-If any information is missing, write "Not specified"."""
-            
-            message = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4096,
-                temperature=0,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Analyze this crash report and extract the requested information: \n\n{sanitized_text}"
-                    }
-                ]
-            )
-            return str(message.content)
+            request = self.build_analysis_request(text)
+            message = self.guard.call(
+                lambda: self.anthropic.messages.create(**request), estimate_request_tokens(request))
+            self.record_usage(message.usage)
+            return message_text(message)
+        except Exception as e:
+            logger.error(f"Error analyzing with Claude: {str(e)}")
+            raise
+
+    async def analyze_with_claude_async(self, text: str, prepared: bool = False) -> Optional[str]:
+        """Send text to Claude for analysis without blocking the event loop"""
+        try:
+            request = self.build_analysis_request(text, prepared)
+            message = await self.guard.call_async(
+                lambda: self.async_anthropic.messages.create(**request), estimate_request_tokens(request))
+            self.record_usage(message.usage)
+            return message_text(message)
         except Exception as e:
             logger.error(f"Error analyzing with Claude: {str(e)}")
             raise
 
+    def build_packed_request(self, reports: List[tuple[str, str]]) -> Dict:
+        """Build one messages.create request for several prepared (report id, text) pairs"""
+        return {
+            "model": CLAUDE_MODEL,
+            "max_tokens": 4096,
+            "temperature": 0,
+            "system": packed_system_prompt(),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": packed_user_message(reports)
+                }
+            ]
+        }
+
+    async def analyze_packed_async(self, reports: List[tuple[str, str]]) -> Dict[str, Dict]:
+        """Analyze several prepared reports in one Claude request.
+
+        Returns parsed results keyed by report id, only for sections that came
+        back complete; callers re-run the missing ids on their own.
+        """
+        try:
+            request = self.build_packed_request(reports)
+            message = await self.guard.call_async(
+                lambda: self.async_anthropic.messages.create(**request), estimate_request_tokens(request))
+            self.record_usage(message.usage)
+        except Exception as e:
+            logger.error(f"Error analyzing packed reports with Claude: {str(e)}")
+            raise
+
+        response = message_text(message)
+        parts = PACKED_SECTION_PATTERN.split(response)
+        expected_ids = {report_id for report_id, _ in reports}
+        results = {}
+        # split() yields [preamble, id1, section1, id2, section2, ...]
+        for report_id, section in zip(parts[1::2], parts[2::2]):
+            if report_id not in expected_ids:
+                continue
+            if "INCIDENT SUMMARY:" not in section or "CRASH DATE:" not in section or "VEHICLE" not in section:
+                continue
+            try:
+                results[report_id] = self.parse_analysis_response(section.strip())
+            except Exception:
+                continue
+        return results
+
     def parse_analysis_response(self, response: str) -> Dict:
         """Parse Claude's response into structured data"""
         try:
@@ -143,8 +307,18 @@ If any information is missing, write "Not specified"."""
     def analyze_pdf(self, pdf_file) -> Dict:
         """Complete PDF analysis pipeline"""
         try:
+            pdf_bytes = self.read_pdf_bytes(pdf_file)
+
+            # Identical uploads are served from the cache without another Claude call
+            cache_key = self.cache_key(pdf_bytes)
+            if self.cache is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Analysis cache hit for {cache_key[:12]}")
+                    return cached
+
             # Extract text from PDF
-            text = self.extract_text_from_pdf(pdf_file)
+            text = self.extract_text_from_pdf(pdf_bytes)
             
             # Analyze with Claude
             analysis = self.analyze_with_claude(text)
@@ -153,20 +327,220 @@ If any information is missing, write "Not specified"."""
             
             # Parse response
             result = self.parse_analysis_response(analysis)
+
+            if self.cache is not None:
+                self.cache.set(cache_key, result)
             
             return result
         except Exception as e:
             logger.error(f"Error in PDF analysis pipeline: {str(e)}")
             raise
 
+    async def analyze_pdf_async(self, pdf_file) -> Dict:
+        """Complete PDF analysis pipeline using the async Claude client"""
+        try:
+            pdf_bytes = self.read_pdf_bytes(pdf_file)
+
+            cache_key = self.cache_key(pdf_bytes)
+            if self.cache is not None:
+                # The cache does SQLite I/O under a lock, so keep it off the event loop
+                cached = await asyncio.to_thread(self.cache.get, cache_key)
+                if cached is not None:
+                    logger.info(f"Analysis cache hit for {cache_key[:12]}")
+                    return cached
+
+            loop = asyncio.get_running_loop()
+            # Pruning is CPU-bound too, so it runs on the pool alongside extraction
+            text = await loop.run_in_executor(self.extraction_pool, self.extract_report_text, pdf_bytes)
+
+            analysis = await self.analyze_with_claude_async(text, prepared=True)
+            if not analysis:
+                raise ValueError("Failed to get analysis from Claude")
+
+            result = self.parse_analysis_response(analysis)
+
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.set, cache_key, result)
+
+            return result
+        except Exception as e:
+            logger.error(f"Error in PDF analysis pipeline: {str(e)}")
+            raise
+
+    def _batch_tasks(self, pdf_files: List[tuple[str, bytes]],
+                     concurrency: Optional[int]) -> List["asyncio.Task"]:
+        """Schedule one bounded-concurrency analysis task per (filename, contents) pair"""
+        if concurrency is None:
+            concurrency = int(os.getenv("BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY))
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def analyze_one(index: int, filename: str, contents: bytes) -> Dict:
+            async with semaphore:
+                try:
+                    result = await self.analyze_pdf_async(contents)
+                    return {"index": index, "filename": filename, "result": result}
+                except Exception as e:
+                    logger.error(f"Error analyzing {filename}: {str(e)}")
+                    return {"index": index, "filename": filename, "error": str(e)}
+
+        return [asyncio.ensure_future(analyze_one(index, name, data))
+                for index, (name, data) in enumerate(pdf_files)]
+
+    async def analyze_pdfs_async(self, pdf_files: List[tuple[str, bytes]],
+                                 concurrency: Optional[int] = None) -> List[Dict]:
+        """Analyze (filename, contents) pairs concurrently, returning one record per file in input order.
+
+        Each record holds the file's ``index`` and ``filename`` plus either a
+        ``result`` or an ``error``, so one bad file does not fail the rest of
+        the batch.
+        """
+        return await asyncio.gather(*self._batch_tasks(pdf_files, concurrency))
+
+    async def analyze_pdfs_packed_async(self, pdf_files: List[tuple[str, bytes]],
+                                        concurrency: Optional[int] = None) -> List[Dict]:
+        """Like analyze_pdfs_async, but pack small reports several to a Claude request.
+
+        Reports under PACK_MAX_REPORT_TOKENS are grouped up to PACK_MAX_REPORTS
+        per request (and PACK_MAX_TOKENS in total); larger reports, and any
+        report whose section of a packed answer does not parse, are analyzed
+        on their own.
+        """
+        if concurrency is None:
+            concurrency = int(os.getenv("BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY))
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+        max_reports = int(os.getenv("PACK_MAX_REPORTS", DEFAULT_PACK_MAX_REPORTS))
+        max_report_tokens = int(os.getenv("PACK_MAX_REPORT_TOKENS", DEFAULT_PACK_MAX_REPORT_TOKENS))
+        max_pack_tokens = int(os.getenv("PACK_MAX_TOKENS", DEFAULT_PACK_MAX_TOKENS))
+        loop = asyncio.get_running_loop()
+        records: List[Optional[Dict]] = [None] * len(pdf_files)
+        cache_keys: Dict[int, str] = {}
+
+        async def succeed(index: int, result: Dict):
+            records[index] = {"index": index, "filename": pdf_files[index][0], "result": result}
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.set, cache_keys[index], result)
+
+        def fail(index: int, error: Exception):
+            logger.error(f"Error analyzing {pdf_files[index][0]}: {str(error)}")
+            records[index] = {"index": index, "filename": pdf_files[index][0], "error": str(error)}
+
+        async def prepare(index: int, contents: bytes) -> Optional[tuple[int, str]]:
+            try:
+                cache_keys[index] = self.cache_key(contents)
+                if self.cache is not None:
+                    cached = await asyncio.to_thread(self.cache.get, cache_keys[index])
+                    if cached is not None:
+                        records[index] = {"index": index, "filename": pdf_files[index][0], "result": cached}
+                        return None
+                return index, await loop.run_in_executor(
+                    self.extraction_pool, self.extract_report_text, contents)
+            except Exception as e:
+                fail(index, e)
+                return None
+
+        prepared = [item for item in await asyncio.gather(
+            *(prepare(index, contents) for index, (_, contents) in enumerate(pdf_files))) if item]
+
+        # Greedily group small reports into packs; large ones go alone
+        packs: List[List[tuple[int, str]]] = []
+        singles: List[tuple[int, str]] = []
+        current: List[tuple[int, str]] = []
+        current_tokens = 0
+        for index, text in prepared:
+            tokens = estimate_tokens(text)
+            if tokens > max_report_tokens or max_reports < 2:
+                singles.append((index, text))
+                continue
+            if current and (len(current) >= max_reports or current_tokens + tokens > max_pack_tokens):
+                packs.append(current)
+                current, current_tokens = [], 0
+            current.append((index, text))
+            current_tokens += tokens
+        if len(current) > 1:
+            packs.append(current)
+        else:
+            singles.extend(current)
+
+        async def run_single(index: int, text: str):
+            async with semaphore:
+                try:
+                    analysis = await self.analyze_with_claude_async(text, prepared=True)
+                    if not analysis:
+                        raise ValueError("Failed to get analysis from Claude")
+                    await succeed(index, self.parse_analysis_response(analysis))
+                except Exception as e:
+                    fail(index, e)
+
+        async def run_pack(pack: List[tuple[int, str]]):
+            async with semaphore:
+                try:
+                    results = await self.analyze_packed_async(
+                        [(f"R{index}", text) for index, text in pack])
+                except Exception:
+                    results = {}
+            retries = []
+            for index, text in pack:
+                if f"R{index}" in results:
+                    await succeed(index, results[f"R{index}"])
+                else:
+                    retries.append(run_single(index, text))
+            if retries:
+                logger.info(f"Re-running {len(retries)} of {len(pack)} packed reports individually")
+                await asyncio.gather(*retries)
+
+        await asyncio.gather(
+            *(run_pack(pack) for pack in packs),
+            *(run_single(index, text) for index, text in singles)
+        )
+        return records
+
+    async def iter_analyses_async(self, pdf_files: List[tuple[str, bytes]],
+                                  concurrency: Optional[int] = None) -> AsyncIterator[Dict]:
+        """Like analyze_pdfs_async, but yield each record as soon as it finishes (completion order)"""
+        tasks = self._batch_tasks(pdf_files, concurrency)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # A client that disconnects mid-stream should not leave analyses running
+            for task in tasks:
+                task.cancel()
+
     def test_connection(self) -> tuple[bool, str]:
         """Test connection to Claude API"""
         try:
             test_message = self.anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
+                model=CLAUDE_MODEL,
                 max_tokens=100,
                 messages=[{"role": "user", "content": "Hi"}]
             )
-            return True, str(test_message.content)
+            return True, message_text(test_message)
         except Exception as e:
-            return False, str(e) 
\ No newline at end of file
+            return False, str(e)
+
+    async def check_upstream_async(self) -> tuple[bool, str]:
+        """Check Claude API reachability by looking up the configured model; costs no tokens"""
+        try:
+            model = await self.async_anthropic.models.retrieve(CLAUDE_MODEL)
+            return True, model.id
+        except Exception as e:
+            return False, str(e)
+
+    def pool_stats(self) -> Dict:
+        """Report extraction pool size and backlog for readiness checks"""
+        # ThreadPoolExecutor exposes no public queue metrics; its work queue is the backlog
+        work_queue = getattr(self.extraction_pool, "_work_queue", None)
+        queued = work_queue.qsize() if work_queue is not None else 0
+        return {
+            "extraction_workers": self.extraction_workers,
+            "extraction_queued": queued,
+            "extraction_saturated": queued > 0,
+            "extraction_processes": getattr(self.process_pool, "_max_workers", 0) if self.process_pool else 0,
+        }
+
+    async def aclose(self):
+        """Release the extraction pools and async HTTP connections"""
+        self.extraction_pool.shutdown(wait=False, cancel_futures=True)
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+        await self.async_anthropic.close()
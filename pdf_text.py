@@ -0,0 +1,150 @@
+import logging
+import os
+import re
+import time
+from concurrent.futures import Executor, Future
+from io import BytesIO
+from typing import Callable, Dict, Iterator, List, Optional
+from PyPDF2 import PdfReader
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio used to turn a token budget into a character budget
+CHARS_PER_TOKEN = 4
+
+# Below this many pages, splitting across processes costs more than it saves
+DEFAULT_PARALLEL_PAGE_THRESHOLD = 16
+DEFAULT_PAGES_PER_CHUNK = 8
+
+# Separates pages in extracted text, so page headers/footers can be recognised later
+PAGE_BREAK = "\f"
+
+_NON_ASCII = re.compile(r'[^\x00-\x7f]')
+
+def normalize_text(text: str) -> str:
+    """Replace every non-ASCII character with a space in a single pass"""
+    return _NON_ASCII.sub(' ', text)
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for budgeting, without calling the tokenizer"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def default_char_budget() -> Optional[int]:
+    """Character budget from PDF_MAX_CHARS / PDF_MAX_TOKENS, or None for unlimited"""
+    max_chars = os.getenv("PDF_MAX_CHARS")
+    if max_chars:
+        return int(max_chars)
+    max_tokens = os.getenv("PDF_MAX_TOKENS")
+    if max_tokens:
+        return int(max_tokens) * CHARS_PER_TOKEN
+    return None
+
+def _iter_timed_pages(pdf_reader: PdfReader, start: int = 0, stop: Optional[int] = None,
+                      on_error: Optional[Callable[[Exception], None]] = None
+                      ) -> Iterator[tuple[int, Optional[str], float]]:
+    """Yield (page number, normalized text, seconds) for pages [start, stop), one page at a time.
+
+    A page that fails to extract is yielded with ``None`` text; ``on_error``
+    is called with the exception if given, otherwise the error is logged.
+    """
+    if stop is None:
+        stop = len(pdf_reader.pages)
+    for page_number in range(start, stop):
+        started = time.perf_counter()
+        try:
+            page_text = normalize_text(pdf_reader.pages[page_number].extract_text())
+        except Exception as e:
+            if on_error is not None:
+                on_error(e)
+            else:
+                logger.error(f"Error processing page {page_number + 1}: {str(e)}")
+            page_text = None
+        yield page_number, page_text, time.perf_counter() - started
+
+def _collect_pages(timed_pages: Iterator[tuple[int, Optional[str], float]],
+                   max_chars: Optional[int]) -> List[tuple[int, Optional[str], float]]:
+    """Consume pages in order until ``max_chars`` characters have been collected"""
+    pages = []
+    collected = 0
+    for page in timed_pages:
+        pages.append(page)
+        if page[1] is not None:
+            collected += len(page[1]) + 1
+        if max_chars is not None and collected >= max_chars:
+            logger.info(f"Stopped PDF extraction at the {max_chars} character budget")
+            break
+    return pages
+
+def _join_pages(pages: List[tuple[int, Optional[str], float]], max_chars: Optional[int]) -> str:
+    """One line break after each extracted page and PAGE_BREAK between pages, truncated to ``max_chars``"""
+    text = PAGE_BREAK.join(page_text + "\n" for _, page_text, _ in pages if page_text is not None)
+    return text[:max_chars] if max_chars is not None else text
+
+def extract_text(pdf_file, max_chars: Optional[int] = None,
+                 on_error: Optional[Callable[[Exception], None]] = None) -> str:
+    """Extract normalized text from a PDF, one line break after each page and PAGE_BREAK between pages.
+
+    Extraction stops as soon as ``max_chars`` characters have been collected
+    (the result is truncated to that length), so later pages of very large
+    attachments are never parsed. ``None`` means no limit. Pages that fail to
+    extract are skipped; ``on_error`` is called with the exception if given,
+    otherwise the error is logged.
+    """
+    pages = _collect_pages(_iter_timed_pages(PdfReader(pdf_file), on_error=on_error), max_chars)
+    return _join_pages(pages, max_chars)
+
+def _extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> List[tuple[int, Optional[str], float]]:
+    """Extract pages [start, stop) as (page number, normalized text, seconds); runs in a worker process"""
+    return list(_iter_timed_pages(PdfReader(BytesIO(pdf_bytes)), start, stop))
+
+def _pooled_pages(futures: List[Future]) -> Iterator[tuple[int, Optional[str], float]]:
+    """Yield the pages of page-range futures in submission (document) order.
+
+    Closing the iterator early cancels the ranges that have not started yet.
+    """
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def extract_text_with_timings(pdf_bytes: bytes, max_chars: Optional[int] = None,
+                              process_pool: Optional[Executor] = None,
+                              parallel_threshold: Optional[int] = None,
+                              pages_per_chunk: Optional[int] = None) -> tuple[str, List[Dict]]:
+    """Extract normalized text plus per-page timings ({"page", "seconds"}).
+
+    PDFs with at least ``parallel_threshold`` pages are split into page ranges
+    extracted on ``process_pool`` and reassembled in page order; smaller PDFs,
+    or calls without a pool, are extracted in-process. Either way extraction
+    stops early at ``max_chars``: queued page ranges past the budget are
+    cancelled.
+    """
+    if parallel_threshold is None:
+        parallel_threshold = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", DEFAULT_PARALLEL_PAGE_THRESHOLD))
+    if pages_per_chunk is None:
+        pages_per_chunk = int(os.getenv("PDF_PAGES_PER_CHUNK", DEFAULT_PAGES_PER_CHUNK))
+
+    pdf_reader = PdfReader(BytesIO(pdf_bytes))
+    page_count = len(pdf_reader.pages)
+
+    if process_pool is None or page_count < parallel_threshold:
+        pages = _collect_pages(_iter_timed_pages(pdf_reader), max_chars)
+    else:
+        futures = [
+            process_pool.submit(_extract_page_range, pdf_bytes, start, min(start + pages_per_chunk, page_count))
+            for start in range(0, page_count, pages_per_chunk)
+        ]
+        pooled = _pooled_pages(futures)
+        try:
+            pages = _collect_pages(pooled, max_chars)
+        finally:
+            pooled.close()
+
+    timings = [{"page": page_number + 1, "seconds": seconds} for page_number, _, seconds in pages]
+    return _join_pages(pages, max_chars), timings
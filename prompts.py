@@ -0,0 +1,86 @@
+import os
+from typing import Dict, List
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-sonnet-20240229")
+
+# Part of the analysis cache key; bump it whenever the prompts or the response
+# parser change so results produced under the old format are not served
+ANALYSIS_VERSION = "1"
+
+SYSTEM_PROMPT = """You are a specialized assistant analyzing automobile crash records.
+Analyze the provided crash report and return ONLY the following information in this EXACT format:
+
+INCIDENT SUMMARY:
+[2-3 sentence summary of the crash]
+
+CRASH DATE: [MM/DD/YYYY format - date only, no time]
+
+VEHICLE 1:
+Owner Name: [full name]
+Owner Address: [complete address]
+Make: [make]
+Model: [model]
+Year: [year]
+Damage: [damage details]
+Injuries: [injury status]
+Insurance Company: [insurance company name]
+Insurance Policy #: [policy number]
+Towing Company: [name of towing company]
+
+VEHICLE 2:
+Owner Name: [full name]
+Owner Address: [complete address]
+Make: [make]
+Model: [model]
+Year: [year]
+Damage: [damage details]
+Injuries: [injury status]
+Insurance Company: [insurance company name]
+Insurance Policy #: [policy number]
+Towing Company: [name of towing company]
+
+If any information is missing, write "Not specified"."""
+
+USER_PROMPT_PREFIX = "Analyze this crash report and extract the requested information: \n\n"
+
+# Delimiter used to pack several reports into one request and to split the answer back out
+REPORT_DELIMITER = "=== REPORT {report_id} ==="
+
+PACKED_PROMPT = """You will receive several separate crash reports in one message.
+Each report begins with a line of the form "=== REPORT <id> ===".
+For EACH report, in the order given, output that same "=== REPORT <id> ===" line followed by
+the information for that report only, in the EXACT format above.
+Never combine information from different reports."""
+
+PACKED_USER_PROMPT_PREFIX = "Analyze each of these crash reports and extract the requested information: \n\n"
+
+def cached_system_prompt() -> List[Dict]:
+    """System prompt as content blocks, marked cacheable so repeat requests reuse the prefix"""
+    return [
+        {
+            "type": "text",
+            "text": SYSTEM_PROMPT,
+            "cache_control": {"type": "ephemeral"}
+        }
+    ]
+
+def packed_system_prompt() -> List[Dict]:
+    """System prompt plus multi-report instructions; the cache marker covers both blocks"""
+    return [
+        {"type": "text", "text": SYSTEM_PROMPT},
+        {
+            "type": "text",
+            "text": PACKED_PROMPT,
+            "cache_control": {"type": "ephemeral"}
+        }
+    ]
+
+def packed_user_message(reports: List[tuple[str, str]]) -> str:
+    """Join (report id, text) pairs into one delimited user message"""
+    return PACKED_USER_PROMPT_PREFIX + "\n\n".join(
+        f"{REPORT_DELIMITER.format(report_id=report_id)}\n{text}" for report_id, text in reports
+    )
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import anthropic
+from dotenv import load_dotenv
+from pdf_text import estimate_tokens
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_REQUESTS_PER_MINUTE = 50
+DEFAULT_TOKENS_PER_MINUTE = 40000
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 60.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+
+# HTTP statuses worth retrying: rate limited, upstream errors and Anthropic's "overloaded"
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Claude while the circuit breaker is open"""
+
+class RateLimiter:
+    """Token-bucket limiter on both requests per minute and (input) tokens per minute"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._request_allowance = min(
+            self.requests_per_minute, self._request_allowance + elapsed * self.requests_per_minute / 60)
+        self._token_allowance = min(
+            self.tokens_per_minute, self._token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request and ``tokens`` tokens if available; otherwise return seconds to wait"""
+        # A request larger than the whole bucket would never fit; let it through once the bucket is full
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                self._request_allowance -= 1
+                self._token_allowance -= tokens
+                return 0.0
+            request_wait = max(1 - self._request_allowance, 0) * 60 / self.requests_per_minute
+            token_wait = max(tokens - self._token_allowance, 0) * 60 / self.tokens_per_minute
+            return max(request_wait, token_wait)
+
+    def acquire(self, tokens: int):
+        """Block until one request of ``tokens`` tokens fits within the limits"""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        """Wait, without blocking the event loop, until one request of ``tokens`` tokens fits"""
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """Charge (or refund) the difference between the estimated and actual token count"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._token_allowance -= actual_tokens - estimated_tokens
+
+class CircuitBreaker:
+    """Fails fast after repeated upstream failures, probing again after a cool-down"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError while open; after the cool-down, let calls probe the upstream"""
+        if self.state == "open":
+            raise CircuitOpenError("Claude API circuit breaker is open; failing fast")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Opening Claude API circuit breaker after {self._failures} failures")
+                # A failed half-open probe re-opens the circuit for another cool-down
+                self._opened_at = time.monotonic()
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits, overloads, server errors and connection problems"""
+    if isinstance(error, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUSES
+    return False
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the retry-after header from an API error, if present"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+def estimate_request_tokens(request: Dict) -> int:
+    """Estimate the input tokens of a messages.create request"""
+    system = request.get("system", "")
+    if isinstance(system, list):
+        system = "".join(block.get("text", "") for block in system)
+    content = "".join(
+        message["content"] if isinstance(message["content"], str) else str(message["content"])
+        for message in request.get("messages", [])
+    )
+    return estimate_tokens(system) + estimate_tokens(content)
+
+class ClaudeGuard:
+    """Rate limiting, jittered retry/backoff and a circuit breaker around Claude calls"""
+
+    def __init__(self):
+        self.limiter = RateLimiter(
+            int(os.getenv("CLAUDE_RPM", DEFAULT_REQUESTS_PER_MINUTE)),
+            int(os.getenv("CLAUDE_TPM", DEFAULT_TOKENS_PER_MINUTE))
+        )
+        self.breaker = CircuitBreaker(
+            int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD)),
+            float(os.getenv("CIRCUIT_RESET_SECONDS", DEFAULT_RESET_SECONDS))
+        )
+        self.max_retries = int(os.getenv("CLAUDE_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.backoff_base = float(os.getenv("CLAUDE_BACKOFF_BASE", DEFAULT_BACKOFF_BASE))
+        self.backoff_max = float(os.getenv("CLAUDE_BACKOFF_MAX", DEFAULT_BACKOFF_MAX))
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Seconds to wait before retry ``attempt``: retry-after if given, else full-jitter exponential"""
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _handle_failure(self, attempt: int, error: Exception) -> float:
+        """Record a failed attempt; return the delay before retrying, or re-raise if we should stop"""
+        if not is_retryable(error):
+            raise error
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._backoff(attempt, error)
+        logger.warning(f"Claude call failed ({str(error)}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    def _record_success(self, response, estimated_tokens: int):
+        self.breaker.record_success()
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.limiter.reconcile(estimated_tokens, getattr(usage, "input_tokens", estimated_tokens) or 0)
+
+    def call(self, fn: Callable[[], T], estimated_tokens: int) -> T:
+        """Run a blocking Claude call under the limiter, retrying transient failures"""
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.limiter.acquire(estimated_tokens)
+            try:
+                response = fn()
+            except Exception as e:
+                time.sleep(self._handle_failure(attempt, e))
+                attempt += 1
+                continue
+            self._record_success(response, estimated_tokens)
+            return response
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]], estimated_tokens: int) -> T:
+        """Async counterpart of call"""
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            await self.limiter.acquire_async(estimated_tokens)
+            try:
+                response = await fn()
+            except Exception as e:
+                await asyncio.sleep(self._handle_failure(attempt, e))
+                attempt += 1
+                continue
+            self._record_success(response, estimated_tokens)
+            return response
+
+_claude_guard: Optional[ClaudeGuard] = None
+_claude_guard_lock = threading.Lock()
+
+def get_claude_guard() -> ClaudeGuard:
+    """Return the process-wide guard shared by every Claude caller"""
+    global _claude_guard
+    with _claude_guard_lock:
+        if _claude_guard is None:
+            _claude_guard = ClaudeGuard()
+        return _claude_guard
@@ -0,0 +1,148 @@
+import logging
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from pdf_text import CHARS_PER_TOKEN, PAGE_BREAK, estimate_tokens
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 6000
+DEFAULT_CONTEXT_LINES = 2
+DEFAULT_NARRATIVE_LINES = 20
+# Reports shorter than this are sent whole; pruning would save little
+DEFAULT_MIN_PRUNE_TOKENS = 1500
+# Lines repeated among the first/last PAGE_EDGE_LINES of at least this many pages are headers/footers
+REPEATED_LINE_THRESHOLD = 3
+PAGE_EDGE_LINES = 3
+
+# Lines mentioning any of the fields we extract
+FIELD_PATTERN = re.compile(
+    r"owner|name|address|street|insur|policy|tow|wrecker|make|model|year|damage|"
+    r"injur|vehicle|unit\s*#?\s*\d|driver|crash|collision|date|occurred",
+    re.IGNORECASE
+)
+# Headings that introduce the free-text description of the crash
+NARRATIVE_PATTERN = re.compile(r"narrative|description|summary|investigator.{0,20}(notes|opinion)", re.IGNORECASE)
+DATE_PATTERN = re.compile(r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b\d{4}-\d{2}-\d{2}\b")
+# Legend/code-table rows such as "12 - Ran off road" or "A = Airbag deployed"
+CODE_ROW_PATTERN = re.compile(r"^\s*[0-9A-Z]{1,3}\s*[-=.:)]\s*\S")
+DIGITS_PATTERN = re.compile(r"\d+")
+
+def pruning_enabled() -> bool:
+    """Whether report text should be pruned before analysis (PRUNE_REPORT_TEXT, on by default)"""
+    return os.getenv("PRUNE_REPORT_TEXT", "true").lower() == "true"
+
+def _repeat_key(line: str) -> str:
+    """Key for spotting repeated headers/footers, ignoring page numbers"""
+    return DIGITS_PATTERN.sub("#", line.strip())
+
+def _split_pages(text: str) -> tuple[List[str], List[Optional[int]]]:
+    """Lines of the report, plus each line's page number if it is among the first/last PAGE_EDGE_LINES"""
+    lines: List[str] = []
+    edge_pages: List[Optional[int]] = []
+    for page_number, page in enumerate(text.split(PAGE_BREAK)):
+        page_lines = page.splitlines()
+        content = [index for index, line in enumerate(page_lines) if line.strip()]
+        edges = set(content[:PAGE_EDGE_LINES] + content[-PAGE_EDGE_LINES:])
+        lines.extend(page_lines)
+        edge_pages.extend(page_number if index in edges else None for index in range(len(page_lines)))
+    return lines, edge_pages
+
+def _header_footer_keys(lines: List[str], edge_pages: List[Optional[int]]) -> set:
+    """Repeat keys of lines found at a page edge on at least REPEATED_LINE_THRESHOLD pages.
+
+    Field lines never count: a multi-vehicle report repeats "Make:" or
+    "Insurance Company:" once per unit, and every copy carries data.
+    """
+    pages_by_key = defaultdict(set)
+    for line, page_number in zip(lines, edge_pages):
+        if page_number is not None and not FIELD_PATTERN.search(line):
+            pages_by_key[_repeat_key(line)].add(page_number)
+    return {key for key, pages in pages_by_key.items() if len(pages) >= REPEATED_LINE_THRESHOLD}
+
+def _is_noise(line: str, field_context: bool = False) -> bool:
+    """True for lines that carry no extractable field: code rows and mostly non-letters.
+
+    Lines next to a field label are often its value on a line of its own
+    (an address number, a year), so only code rows are dropped there.
+    """
+    stripped = line.strip()
+    if not stripped:
+        return True
+    if DATE_PATTERN.search(stripped):
+        return False
+    if CODE_ROW_PATTERN.match(stripped) and not FIELD_PATTERN.search(stripped):
+        return True
+    if field_context:
+        return False
+    letters = sum(ch.isalpha() for ch in stripped)
+    return letters < len(stripped) * 0.3
+
+def prune_report_text(text: str, token_budget: Optional[int] = None,
+                      context_lines: Optional[int] = None) -> tuple[str, Dict]:
+    """Keep only the parts of a report likely to hold the extracted fields.
+
+    Returns the text to send and stats with token estimates. Falls back to the
+    (budget-truncated) full text when the report is short or the pruned text
+    looks incomplete, i.e. has no date or no owner/insurance lines.
+    """
+    if token_budget is None:
+        token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    if context_lines is None:
+        context_lines = int(os.getenv("PRUNE_CONTEXT_LINES", DEFAULT_CONTEXT_LINES))
+    min_prune_tokens = int(os.getenv("PRUNE_MIN_TOKENS", DEFAULT_MIN_PRUNE_TOKENS))
+    max_chars = token_budget * CHARS_PER_TOKEN if token_budget > 0 else None
+
+    original_tokens = estimate_tokens(text)
+    stats = {"original_tokens": original_tokens, "pruned": False}
+
+    def full_text(reason: str) -> tuple[str, Dict]:
+        kept = text[:max_chars] if max_chars is not None else text
+        stats.update(sent_tokens=estimate_tokens(kept), reason=reason)
+        return kept, stats
+
+    if original_tokens <= min_prune_tokens:
+        return full_text("short report")
+
+    lines, edge_pages = _split_pages(text)
+    header_footer_keys = _header_footer_keys(lines, edge_pages)
+
+    keep = [False] * len(lines)
+    field_context = [False] * len(lines)
+    narrative_until = -1
+    for index, line in enumerate(lines):
+        if NARRATIVE_PATTERN.search(line):
+            narrative_until = max(narrative_until, index + DEFAULT_NARRATIVE_LINES)
+        is_field = bool(FIELD_PATTERN.search(line) or DATE_PATTERN.search(line))
+        if index <= narrative_until or is_field:
+            for neighbour in range(max(index - context_lines, 0), min(index + context_lines + 1, len(lines))):
+                keep[neighbour] = True
+                field_context[neighbour] = field_context[neighbour] or is_field
+
+    # Keep the first copy of each page header/footer; repeats elsewhere in a page are content
+    kept_lines = []
+    seen_headers = set()
+    for index, line in enumerate(lines):
+        if not keep[index] or _is_noise(line, field_context[index]):
+            continue
+        if edge_pages[index] is not None and not FIELD_PATTERN.search(line):
+            key = _repeat_key(line)
+            if key in header_footer_keys:
+                if key in seen_headers:
+                    continue
+                seen_headers.add(key)
+        kept_lines.append(line)
+    pruned = "\n".join(kept_lines)
+
+    if not DATE_PATTERN.search(pruned) or not re.search(r"owner|insur", pruned, re.IGNORECASE):
+        return full_text("pruned text looked incomplete")
+
+    if max_chars is not None:
+        pruned = pruned[:max_chars]
+    stats.update(pruned=True, sent_tokens=estimate_tokens(pruned), reason="pruned")
+    return pruned, stats
@@ -1,5 +1,6 @@
 import requests
 import os
+import json
 from pathlib import Path
 import logging
 import time
@@ -21,7 +22,7 @@ def wait_for_service():
     """Wait for the API service to be ready"""
     for i in range(MAX_RETRIES):
         try:
-            response = requests.get(f"{BASE_URL}/health")
+            response = requests.get(f"{BASE_URL}/health/live")
             if response.status_code == 200:
                 logger.info("Service is ready!")
                 return True
@@ -41,6 +42,16 @@ def test_health():
         logger.error(f"Health check failed: {str(e)}")
         return False
 
+def test_readiness():
+    """Test the readiness endpoint"""
+    try:
+        response = requests.get(f"{BASE_URL}/health/ready")
+        logger.info(f"Readiness response: {response.json()}")
+        return response.status_code == 200
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        return False
+
 def test_pdf_analysis(pdf_path):
     """Test PDF analysis endpoint"""
     try:
@@ -106,6 +117,8 @@ def test_batch_analysis(pdf_directory):
                 for analysis in results['analyses']:
                     logger.info(f"File: {analysis['filename']}")
                     logger.info(f"Incident Summary: {analysis['incident_summary']}")
+                for error in results.get('errors', []):
+                    logger.warning(f"File {error['filename']} failed: {error['error']}")
                 return True
             else:
                 logger.error(f"Batch analysis failed: {response.text}")
@@ -126,6 +139,113 @@ def test_batch_analysis(pdf_directory):
         logger.error(f"Error in batch analysis: {str(e)}")
         return False
 
+def test_batch_stream(pdf_directory):
+    """Test streaming batch PDF analysis endpoint"""
+    pdf_files = list(Path(pdf_directory).glob("*.pdf"))
+    if not pdf_files:
+        logger.error(f"No PDF files found in {pdf_directory}")
+        return False
+
+    files = []
+    try:
+        files = [
+            ('files', (pdf.name, open(pdf, 'rb'), 'application/pdf'))
+            for pdf in pdf_files
+        ]
+        with requests.post(f"{BASE_URL}/analyze/batch/stream", files=files, stream=True) as response:
+            if response.status_code != 200:
+                logger.error(f"Streaming batch analysis failed: {response.text}")
+                return False
+            summary = None
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record['type'] == 'summary':
+                    summary = record
+                else:
+                    logger.info(f"{record['type']}: {record['filename']}")
+        logger.info(f"Stream summary: {summary}")
+        return summary is not None and summary['total'] == len(pdf_files)
+    except Exception as e:
+        logger.error(f"Error testing streaming batch analysis: {str(e)}")
+        return False
+    finally:
+        for _, file_tuple in files:
+            try:
+                file_tuple[1].close()
+            except:
+                pass
+
+def test_jobs(pdf_directory, timeout=300):
+    """Test background job submission and polling"""
+    pdf_files = list(Path(pdf_directory).glob("*.pdf"))
+    if not pdf_files:
+        logger.error(f"No PDF files found in {pdf_directory}")
+        return False
+
+    files = []
+    try:
+        files = [
+            ('files', (pdf.name, open(pdf, 'rb'), 'application/pdf'))
+            for pdf in pdf_files
+        ]
+        response = requests.post(f"{BASE_URL}/jobs", files=files)
+        if response.status_code != 202:
+            logger.error(f"Job submission failed: {response.text}")
+            return False
+        job_id = response.json()['job_id']
+        logger.info(f"Submitted job {job_id}")
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = requests.get(f"{BASE_URL}/jobs/{job_id}").json()
+            logger.info(f"Job {job_id}: {job['status']} ({job['completed_files']}/{job['total_files']})")
+            if job['status'] in ('completed', 'failed'):
+                return job['status'] == 'completed'
+            time.sleep(RETRY_DELAY)
+        logger.error(f"Job {job_id} did not finish within {timeout} seconds")
+        return False
+    except Exception as e:
+        logger.error(f"Error testing jobs: {str(e)}")
+        return False
+    finally:
+        for _, file_tuple in files:
+            try:
+                file_tuple[1].close()
+            except:
+                pass
+
+def test_read_api():
+    """Test paging, projection and conditional requests on the crash report read API"""
+    try:
+        response = requests.get(f"{BASE_URL}/crashes", params={"limit": 5})
+        assert response.status_code == 200
+        page = response.json()
+        logger.info(f"First page: {len(page['items'])} crash reports, next cursor {page['next_cursor']}")
+
+        # An unchanged page is answered with 304 and no body
+        etag = response.headers["ETag"]
+        response = requests.get(f"{BASE_URL}/crashes", params={"limit": 5}, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        if page["next_cursor"]:
+            response = requests.get(
+                f"{BASE_URL}/crashes",
+                params={"limit": 5, "cursor": page["next_cursor"], "fields": "crash_date,filename"}
+            )
+            assert response.status_code == 200
+            for item in response.json()["items"]:
+                assert set(item) <= {"id", "crash_date", "filename"}
+
+        response = requests.get(f"{BASE_URL}/cases", params={"limit": 5})
+        assert response.status_code == 200
+        logger.info(f"First page: {len(response.json()['items'])} cases")
+        return True
+    except Exception as e:
+        logger.error(f"Read API test failed: {str(e)}")
+        return False
+
 if __name__ == "__main__":
     # Wait for service to be ready
     logger.info("Waiting for service to be ready...")
@@ -138,6 +258,10 @@ if __name__ == "__main__":
     if not test_health():
         logger.error("Health check failed! Stopping tests.")
         sys.exit(1)
+
+    logger.info("Testing readiness endpoint...")
+    if not test_readiness():
+        logger.warning("Service is not ready yet; upstream status may still be refreshing")
     
     # Test single PDF analysis
     pdf_path = input("Enter path to test PDF file: ")
@@ -149,4 +273,16 @@ if __name__ == "__main__":
     pdf_dir = input("Enter directory containing PDF files: ")
     logger.info("Testing batch PDF analysis...")
     if not test_batch_analysis(pdf_dir):
-        logger.error("Batch PDF analysis failed!") 
\ No newline at end of file
+        logger.error("Batch PDF analysis failed!")
+
+    logger.info("Testing streaming batch PDF analysis...")
+    if not test_batch_stream(pdf_dir):
+        logger.error("Streaming batch PDF analysis failed!")
+
+    logger.info("Testing background jobs...")
+    if not test_jobs(pdf_dir):
+        logger.error("Background job analysis failed!")
+
+    logger.info("Testing crash report read API...")
+    if not test_read_api():
+        logger.error("Read API test failed!")
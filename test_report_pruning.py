@@ -0,0 +1,62 @@
+from pdf_text import PAGE_BREAK
+from report_pruning import prune_report_text
+
+HEADER = "STATE OF TEXAS PEACE OFFICER'S REPORT"
+FOOTER = "Texas Department of Transportation - Form CR-3 - Page {page} of 3"
+
+def vehicle_lines(unit: int, make: str, year: int, insurer: str) -> list:
+    return [
+        f"UNIT {unit}",
+        f"Owner Name: Owner {unit}",
+        "Owner Address: 100 Main St, Austin TX",
+        f"Make: {make}",
+        "Model: Sedan",
+        f"Year: {year}",
+        "Injuries: None",
+        f"Insurance Company: {insurer}",
+        "Towing Company: None",
+    ]
+
+def multi_vehicle_report() -> str:
+    filler = ["Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod"] * 10
+    pages = []
+    for page, (make, year, insurer) in enumerate(
+            [("Honda", 2018, "Geico"), ("Toyota", 2015, "Geico"), ("Ford", 2020, "Progressive")], start=1):
+        lines = [HEADER, "Crash Date: 01/15/2024"] + vehicle_lines(page, make, year, insurer)
+        lines += filler + [FOOTER.format(page=page)]
+        pages.append("\n".join(lines) + "\n")
+    return PAGE_BREAK.join(pages)
+
+def test_prune_keeps_every_vehicle_and_drops_repeated_headers(monkeypatch):
+    monkeypatch.setenv("PRUNE_MIN_TOKENS", "0")
+    pruned, stats = prune_report_text(multi_vehicle_report(), token_budget=0)
+
+    assert stats["pruned"]
+    lines = pruned.splitlines()
+    for unit in (1, 2, 3):
+        assert f"UNIT {unit}" in lines
+    assert lines.count("Make: Honda") == 1
+    assert lines.count("Make: Toyota") == 1
+    assert lines.count("Make: Ford") == 1
+    assert lines.count("Injuries: None") == 3
+    assert lines.count("Insurance Company: Geico") == 2
+    assert lines.count("Model: Sedan") == 3
+    assert lines.count("Crash Date: 01/15/2024") == 3
+    assert lines.count(HEADER) == 1
+    assert sum(line.startswith("Texas Department of Transportation") for line in lines) <= 1
+
+def test_prune_keeps_values_on_their_own_lines(monkeypatch):
+    monkeypatch.setenv("PRUNE_MIN_TOKENS", "0")
+    filler = ["Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod"] * 10
+    report = "\n".join(
+        ["Crash Date:", "01/15/2024"] + filler
+        + ["Owner Address:", "4521 N IH 35", "Year:", "2019", "Insurance Company:", "Geico"] + filler
+        + ["Narrative", "Unit one struck unit two at low speed.", "0000 1111 2222 3333"]
+    ) + "\n"
+    pruned, stats = prune_report_text(report, token_budget=0)
+
+    assert stats["pruned"]
+    lines = pruned.splitlines()
+    assert "4521 N IH 35" in lines
+    assert "2019" in lines
+    assert "0000 1111 2222 3333" not in lines